@@ -0,0 +1,60 @@
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any
+
+from djmoney.money import Money
+
+# Values the conversations keep besides the plain JSON types, stored as {"__type__": <name>, "value": <string>}
+TYPE_KEY = "__type__"
+
+
+class FSMEncoder(json.JSONEncoder):
+    def default(self, o: Any) -> Any:
+        # datetime before date, it is its subclass
+        if isinstance(o, datetime):
+            return {TYPE_KEY: "datetime", "value": o.isoformat()}
+        if isinstance(o, date):
+            return {TYPE_KEY: "date", "value": o.isoformat()}
+        if isinstance(o, time):
+            return {TYPE_KEY: "time", "value": o.isoformat()}
+        if isinstance(o, timedelta):
+            return {TYPE_KEY: "timedelta", "value": str(o.total_seconds())}
+        if isinstance(o, Decimal):
+            return {TYPE_KEY: "decimal", "value": str(o)}
+        if isinstance(o, Money):
+            return {TYPE_KEY: "money", "value": str(o.amount), "currency": o.currency.code}
+        return super().default(o)
+
+
+def decode_object(obj: dict) -> Any:
+    match obj.get(TYPE_KEY):
+        case None:
+            return obj
+        case "datetime":
+            return datetime.fromisoformat(obj["value"])
+        case "date":
+            return date.fromisoformat(obj["value"])
+        case "time":
+            return time.fromisoformat(obj["value"])
+        case "timedelta":
+            return timedelta(seconds=float(obj["value"]))
+        case "decimal":
+            return Decimal(obj["value"])
+        case "money":
+            return Money(obj["value"], obj["currency"])
+    raise ValueError(f"Unknown stored type {obj[TYPE_KEY]!r}")
+
+
+class FSMDecoder(json.JSONDecoder):
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("object_hook", decode_object)
+        super().__init__(*args, **kwargs)
+
+
+def dumps(data: Any) -> str:
+    return json.dumps(data, cls=FSMEncoder, separators=(",", ":"))
+
+
+def loads(raw: str | bytes) -> Any:
+    return json.loads(raw, cls=FSMDecoder)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.fsm.models import StateRecord
+
+
+class Command(BaseCommand):
+    help = "Delete the bot's conversations untouched for longer than FSM_TTL."
+
+    def handle(self, *args, **options):
+        deleted, _ = StateRecord.objects.expired().delete()
+        self.stdout.write(f"Deleted {deleted} expired conversations")
@@ -0,0 +1,30 @@
+# Generated by Django 5.1 on 2026-10-18 09:33
+
+from django.db import migrations, models
+
+import apps.fsm.codec
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="StateRecord",
+            fields=[
+                ("key", models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ("state", models.CharField(max_length=255, null=True)),
+                (
+                    "data",
+                    models.JSONField(
+                        decoder=apps.fsm.codec.FSMDecoder, default=dict, encoder=apps.fsm.codec.FSMEncoder
+                    ),
+                ),
+                ("version", models.PositiveIntegerField(default=0)),
+                ("expires_at", models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import models
+from django.utils import timezone
+
+from apps.fsm.codec import FSMDecoder, FSMEncoder
+
+
+class StateRecordManager(models.Manager):
+    def expired(self):
+        return self.filter(expires_at__lte=timezone.now())
+
+
+class StateRecord(models.Model):
+    """
+    State and data of one conversation with the bot.
+
+    The key is aiogram's storage key joined into a string, "fsm:<bot>:<chat>:<user>:<destiny>" with the thread
+    and business connection when they are set. `version` grows with each write.
+    """
+
+    key = models.CharField(max_length=255, primary_key=True)
+    state = models.CharField(max_length=255, null=True)
+    data = models.JSONField(default=dict, encoder=FSMEncoder, decoder=FSMDecoder)
+    version = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
+
+    objects = StateRecordManager()
+
+    def __str__(self):
+        return f"{self.key}: {self.state}"
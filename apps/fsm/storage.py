@@ -0,0 +1,124 @@
+from datetime import timedelta
+from typing import TYPE_CHECKING, Any, Callable
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from apps.fsm.codec import dumps, loads
+from utils.bot.db_executor import database_sync_to_async
+
+if TYPE_CHECKING:
+    from apps.fsm.models import StateRecord
+
+# Writes retried after a concurrent one took the version, then the conflict is raised
+MAX_ATTEMPTS = 5
+
+key_builder = DefaultKeyBuilder(with_bot_id=True, with_business_connection_id=True, with_destiny=True)
+
+
+class StateConflictError(Exception):
+    pass
+
+
+class DatabaseStorage(BaseStorage):
+    """
+    Conversations in the project's database, shared by all worker processes and kept over restarts.
+
+    Updates are optimistic: a row is written only if its version hasn't changed since it was read,
+    otherwise it is read again and the change is reapplied. Rows untouched for `ttl` count as empty
+    and are deleted by `manage.py clear_expired_states`.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = timedelta(seconds=ttl)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        await database_sync_to_async(self.write)(key_builder.build(key), lambda record: setattr(record, "state", state))
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        record = await database_sync_to_async(load_record)(key_builder.build(key))
+        return record.state if record else None
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        data = data.copy()
+        await database_sync_to_async(self.write)(key_builder.build(key), lambda record: setattr(record, "data", data))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        record = await database_sync_to_async(load_record)(key_builder.build(key))
+        return record.data if record else {}
+
+    async def update_data(self, key: StorageKey, data: dict[str, Any]) -> dict[str, Any]:
+        # Read and written in one go, so that the merge is retried on a concurrent change
+        record = await database_sync_to_async(self.write)(
+            key_builder.build(key), lambda current: current.data.update(data)
+        )
+        return record.data.copy()
+
+    async def close(self) -> None:
+        pass
+
+    def write(self, key: str, change: Callable[["StateRecord"], None]) -> "StateRecord":
+        from apps.fsm.models import StateRecord
+
+        for _attempt in range(MAX_ATTEMPTS):
+            record = load_record(key)
+            expires_at = timezone.now() + self.ttl
+            if record is None:
+                record = StateRecord(key=key, expires_at=expires_at)
+                change(record)
+                try:
+                    with transaction.atomic():
+                        record.save(force_insert=True)
+                except IntegrityError:
+                    # Created by another worker in the meantime
+                    continue
+                return record
+
+            change(record)
+            updated = StateRecord.objects.filter(key=key, version=record.version).update(
+                state=record.state, data=record.data, version=record.version + 1, expires_at=expires_at
+            )
+            if updated:
+                record.version += 1
+                record.expires_at = expires_at
+                return record
+
+        raise StateConflictError(f"{key} kept changing for {MAX_ATTEMPTS} attempts")
+
+
+def load_record(key: str) -> "StateRecord | None":
+    from apps.fsm.models import StateRecord
+
+    record = StateRecord.objects.filter(key=key).first()
+    if record and record.expires_at <= timezone.now():
+        # Expired and not cleaned up yet: empty, but the version stays for the next write to replace it
+        record.state, record.data = None, {}
+    return record
+
+
+def make_storage() -> BaseStorage:
+    url = settings.FSM_STORAGE
+    if url == "database":
+        return DatabaseStorage(ttl=settings.FSM_TTL)
+    if url == "memory":
+        return MemoryStorage()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        # Optional, needs the redis package
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        return RedisStorage.from_url(
+            url,
+            key_builder=key_builder,
+            state_ttl=settings.FSM_TTL,
+            data_ttl=settings.FSM_TTL,
+            json_dumps=dumps,
+            json_loads=loads,
+        )
+    raise ImproperlyConfigured(f"Unknown FSM_STORAGE {url!r}")
@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from django.db.models import F
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.fsm.models import StateRecord
+from apps.fsm.storage import MAX_ATTEMPTS, DatabaseStorage, StateConflictError, load_record
+
+KEY = "fsm:1:2:2:default"
+
+
+class DatabaseStorageWriteTests(TestCase):
+    def setUp(self):
+        self.storage = DatabaseStorage(ttl=60)
+
+    def test_creates_and_bumps_the_version(self):
+        record = self.storage.write(KEY, lambda record: setattr(record, "state", "Form:name"))
+        self.assertEqual((record.state, record.version), ("Form:name", 0))
+
+        record = self.storage.write(KEY, lambda record: record.data.update(name="Anna"))
+        self.assertEqual((record.state, record.data, record.version), ("Form:name", {"name": "Anna"}, 1))
+        stored = StateRecord.objects.get(key=KEY)
+        self.assertEqual((stored.state, stored.data, stored.version), ("Form:name", {"name": "Anna"}, 1))
+
+    def test_concurrent_write_is_reapplied(self):
+        self.storage.write(KEY, lambda record: record.data.update(a=1))
+        calls = []
+
+        def change(record):
+            if not calls:
+                # Another worker writes between the read and the write
+                StateRecord.objects.filter(key=KEY).update(data={"a": 1, "b": 2}, version=F("version") + 1)
+            calls.append(record.version)
+            record.data.update(c=3)
+
+        record = self.storage.write(KEY, change)
+        self.assertEqual(calls, [0, 1])
+        self.assertEqual(record.version, 2)
+        self.assertEqual(StateRecord.objects.get(key=KEY).data, {"a": 1, "b": 2, "c": 3})
+
+    def test_concurrent_create_is_reapplied(self):
+        calls = []
+
+        def change(record):
+            if not calls:
+                StateRecord.objects.create(key=KEY, data={"a": 1}, expires_at=timezone.now() + timedelta(minutes=1))
+            calls.append(record.version)
+            record.data.update(b=2)
+
+        record = self.storage.write(KEY, change)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual((record.data, record.version), ({"a": 1, "b": 2}, 1))
+
+    def test_gives_up_on_a_row_that_keeps_changing(self):
+        self.storage.write(KEY, lambda record: None)
+        calls = []
+
+        def change(record):
+            calls.append(record.version)
+            StateRecord.objects.filter(key=KEY).update(version=F("version") + 1)
+
+        with self.assertRaises(StateConflictError):
+            self.storage.write(KEY, change)
+        self.assertEqual(len(calls), MAX_ATTEMPTS)
+
+    def test_expired_record_reads_as_empty(self):
+        StateRecord.objects.create(
+            key=KEY, state="Form:name", data={"a": 1}, version=3, expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        record = load_record(KEY)
+        self.assertEqual((record.state, record.data, record.version), (None, {}, 3))
+
+        record = self.storage.write(KEY, lambda record: record.data.update(b=2))
+        self.assertEqual((record.data, record.version), ({"b": 2}, 4))
+        self.assertGreater(record.expires_at, timezone.now())
@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-18 09:50
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("roles", "0002_alter_provider_paid_until"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                django.db.models.functions.comparison.Coalesce("full_name", models.Value("")),
+                models.F("id"),
+                name="user_sort_name_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-18 10:59
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("roles", "0003_user_sort_name_index"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="user",
+            name="user_sort_name_idx",
+        ),
+    ]
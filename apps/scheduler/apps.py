@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class SchedulerConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "apps.scheduler"
+
+    def ready(self):
+        from apps.scheduler import signals  # noqa: F401
@@ -0,0 +1,186 @@
+import json
+import random
+import timeit
+from datetime import datetime, time, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.roles.models import Provider, User
+from apps.scheduler.models import Break, ProviderDayOccupancy, Reservation, Vacation
+from apps.scheduler.services import availability_cache, find_available_slots, get_events_by_day, get_provider_overview
+
+TABLES = (Reservation, Break, Vacation, ProviderDayOccupancy)
+BASELINES = Path(__file__).resolve().parents[2] / "benchmarks.json"
+
+# Reservations per working day of the synthetic providers
+LOADS = (0, 5, 20, 50)
+PROVIDER_TZ = ZoneInfo("Europe/Kyiv")
+CLIENT_TZS = (ZoneInfo("Europe/Kyiv"), ZoneInfo("America/New_York"), ZoneInfo("Asia/Tokyo"))
+HISTORY_DAYS = 60
+UPCOMING_DAYS = 28
+# Calls of a case per timed run
+NUMBER = 5
+# Database round trips and Python work of the reference workload, which never changes along with the code
+REFERENCE_QUERIES = 30
+REFERENCE_ITEMS = 20_000
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the slot engine on synthetic calendars and compare with the stored baselines. "
+        "Times are compared as ratios to a fixed reference workload run alongside, so baselines hold on any machine. "
+        "The calendars are created in a transaction which is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--update", action="store_true", help="Store the results as the new baselines.")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=1.5,
+            help="Fail if a case is this many times slower than its baseline, relative to the reference workload.",
+        )
+        parser.add_argument("--repeat", type=int, default=7, help="Take the best of this many runs of every case.")
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        with transaction.atomic():
+            providers, clients = seed()
+            analyze()
+            results = run_cases(providers, clients, options["repeat"])
+            transaction.set_rollback(True)
+        availability_cache.local.clear()
+
+        if options["update"]:
+            # Seconds depend on the machine, only the query counts and the ratios are kept
+            baselines = {
+                case: {"queries": result["queries"], "ratio": result["ratio"]} for case, result in results.items()
+            }
+            BASELINES.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Stored {len(results)} baselines in {BASELINES}"))
+            return
+
+        baselines = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+        regressions = []
+        for case, result in results.items():
+            baseline = baselines.get(case)
+            line = f"{case}: {result['queries']} queries, {result['ratio']:.2f}x ({result['seconds'] * 1000:.2f} ms)"
+            if baseline:
+                line += f" (baseline {baseline['queries']} queries, {baseline['ratio']:.2f}x)"
+                slower = result["ratio"] > baseline["ratio"] * options["tolerance"]
+                if result["queries"] > baseline["queries"] or slower:
+                    regressions.append(case)
+                    line = self.style.ERROR(line)
+            self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} regressed: " + ", ".join(regressions))
+
+
+def seed() -> tuple[dict[int, Provider], list[User]]:
+    today = datetime.now(tz=PROVIDER_TZ).date()
+    first_day = today - timedelta(days=HISTORY_DAYS)
+    last_day = today + timedelta(days=UPCOMING_DAYS)
+    suffix = random.getrandbits(32)
+
+    clients = [
+        User.objects.create(username=f"benchmark-client-{suffix}-{i}", first_name="Client", tz=tz)
+        for i, tz in enumerate(CLIENT_TZS)
+    ]
+    providers = {}
+    for load in LOADS:
+        user = User.objects.create(
+            username=f"benchmark-provider-{suffix}-{load}",
+            first_name="Provider",
+            tz=PROVIDER_TZ,
+        )
+        # Long enough working hours to fit 50 quarter-hour reservations with breaks and lunch
+        provider = Provider.objects.create(
+            user=user,
+            start=time(7),
+            end=time(22),
+            lunch_start=time(13),
+            lunch_end=time(14),
+            weekend="6",
+        )
+        providers[load] = provider
+
+        reservations, breaks = [], []
+        day = first_day
+        while day <= last_day:
+            # Quarter-hour ticks of the working hours outside lunch, taken at random
+            ticks = [tick for tick in range(7 * 4, 22 * 4) if not 13 * 4 <= tick < 14 * 4]
+            taken = sorted(random.sample(ticks, min(load + 2, len(ticks))))
+            for i, tick in enumerate(taken):
+                start = datetime.combine(day, time(), tzinfo=PROVIDER_TZ) + timedelta(minutes=15 * tick)
+                event = dict(provider=provider, date=start.date(), start=start, end=start + timedelta(minutes=15))
+                if i < 2:
+                    breaks.append(Break(**event))
+                else:
+                    reservations.append(Reservation(client=clients[i % len(clients)], **event))
+            day += timedelta(days=1)
+
+        Reservation.objects.bulk_create(reservations)
+        Break.objects.bulk_create(breaks)
+        Vacation.objects.create(
+            provider=provider,
+            start_date=today + timedelta(days=10),
+            end_date=today + timedelta(days=23),
+        )
+        ProviderDayOccupancy.objects.rebuild(provider, since=first_day - timedelta(days=1))
+
+    return providers, clients
+
+
+def analyze() -> None:
+    # Fresh planner statistics, otherwise Postgres plans the seeded tables as if they were empty
+    with connection.cursor() as cursor:
+        for model in TABLES:
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+
+
+def run_cases(providers: dict[int, Provider], clients: list[User], repeat: int) -> dict[str, dict]:
+    tomorrow = datetime.now(tz=PROVIDER_TZ).date() + timedelta(days=1)
+    cases = {}
+    for load, provider in providers.items():
+        for client in clients:
+            cases[f"find_available_slots/{load}/{client.tz}"] = lambda provider=provider, client=client: [
+                find_available_slots(client, provider, tomorrow + timedelta(days=i), client=client, event_duration=45)
+                for i in range(7)
+            ]
+        cases[f"get_events_by_day/{load}"] = lambda provider=provider: [
+            get_events_by_day(day=tomorrow + timedelta(days=i), provider=provider) for i in range(7)
+        ]
+        cases[f"get_provider_overview/{load}"] = lambda provider=provider: get_provider_overview(
+            provider, tomorrow, tomorrow + timedelta(days=UPCOMING_DAYS)
+        )
+
+    # Cold availability cache every run, it is the computation that is measured
+    setup = availability_cache.local.clear
+    results = {}
+    for name, case in cases.items():
+        with CaptureQueriesContext(connection) as queries:
+            setup()
+            case()
+        results[name] = {"queries": len(queries.captured_queries), "seconds": float("inf")}
+    # Every case is timed right after the reference, so that the machine getting busier or quieter affects both alike
+    for _run in range(repeat):
+        for name, case in cases.items():
+            reference = timeit.timeit(reference_workload, number=NUMBER) / NUMBER
+            seconds = timeit.timeit(lambda: (setup(), case()), number=NUMBER) / NUMBER
+            results[name]["seconds"] = min(results[name]["seconds"], seconds)
+            results[name]["ratio"] = min(results[name].get("ratio", float("inf")), round(seconds / reference, 3))
+    return results
+
+
+def reference_workload() -> None:
+    # Round trips and sorting, a mix like the cases' but fixed, so that a uniformly slower engine shows up
+    with connection.cursor() as cursor:
+        for _query in range(REFERENCE_QUERIES):
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+    sorted(range(REFERENCE_ITEMS, 0, -1), key=str)
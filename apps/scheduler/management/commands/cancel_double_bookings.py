@@ -0,0 +1,61 @@
+from collections import defaultdict
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from apps.scheduler.models import Reservation
+from apps.scheduler.services import invalidate_availability
+
+
+class Command(BaseCommand):
+    help = (
+        "List reservations overlapping an earlier booked one of the same provider, "
+        "which keep the reservation_provider_no_overlap constraint from being added. "
+        "Nothing is changed without --cancel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--cancel",
+            action="store_true",
+            help="Cancel the listed reservations, the earliest booked of the overlapping ones stay.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            double_bookings = find_double_bookings()
+            for pk, kept_pk in double_bookings:
+                self.stdout.write(f"Reservation {pk} overlaps reservation {kept_pk}")
+            if not double_bookings:
+                self.stdout.write(self.style.SUCCESS("No double bookings"))
+                return
+            if not options["cancel"]:
+                self.stdout.write(f"{len(double_bookings)} double bookings, pass --cancel to cancel them")
+                return
+
+            # One by one through save, so that the occupancy of their days is recomputed
+            for reservation in Reservation.objects.filter(pk__in=[pk for pk, _kept_pk in double_bookings]):
+                reservation.is_canceled = True
+                reservation.save()
+                transaction.on_commit(partial(invalidate_availability, reservation.provider_id))
+        self.stdout.write(self.style.SUCCESS(f"Canceled {len(double_bookings)} reservations"))
+
+
+def find_double_bookings() -> list[tuple[int, int]]:
+    # Reservations with the earlier booked ones of the same provider they overlap, earlier booked ones stay
+    reservations = Reservation.objects.filter(
+        is_canceled=False, provider__isnull=False, start__isnull=False, end__isnull=False, end__gt=models.F("start")
+    ).order_by("pk")
+    kept = defaultdict(list)
+    double_bookings = []
+    for pk, provider_id, start, end in reservations.values_list("pk", "provider_id", "start", "end"):
+        overlapped = next(
+            (kept_pk for kept_pk, kept_start, kept_end in kept[provider_id] if start < kept_end and kept_start < end),
+            None,
+        )
+        if overlapped:
+            double_bookings.append((pk, overlapped))
+        else:
+            kept[provider_id].append((pk, start, end))
+    return double_bookings
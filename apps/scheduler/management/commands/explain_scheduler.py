@@ -0,0 +1,101 @@
+import random
+import re
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Min, Q, QuerySet, Value
+from django.db.models.functions import Coalesce
+
+from apps.roles.models import Provider, User
+from apps.scheduler.management.commands.benchmark_scheduler import LOADS, PROVIDER_TZ, analyze, seed
+from apps.scheduler.models import Break, ProviderDayOccupancy, Reservation, Vacation
+from utils.bot.consts import CLIENTS_PAGE_SIZE
+
+# Index names in the plans of index scans and bitmap index scans
+INDEX_IN_PLAN = re.compile(r"(?:Index (?:Only )?Scan (?:Backward )?using|Index Scan on) (\w+)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Show which indexes the database picks for the scheduler's hot queries. "
+        "By default the queries run against the benchmark calendars, created in a transaction which is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--provider", type=int, help="Explain for the existing provider with this pk instead.")
+        parser.add_argument("--verbose-plans", action="store_true", help="Print the full plans as well.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options["provider"]:
+                provider = Provider.objects.select_related("user").filter(pk=options["provider"]).first()
+                if provider is None:
+                    raise CommandError(f"No provider with pk {options['provider']}")
+                client = User.objects.filter(reservations__provider=provider).first() or provider.user
+            else:
+                random.seed(0)
+                providers, clients = seed()
+                provider, client = providers[max(LOADS)], clients[0]
+            analyze()
+            self.report(hot_queries(provider, client), options["verbose_plans"])
+            transaction.set_rollback(True)
+
+    def report(self, queries: dict[str, QuerySet], verbose: bool) -> None:
+        for name, queryset in queries.items():
+            plan = queryset.explain()
+            used = list(dict.fromkeys(INDEX_IN_PLAN.findall(plan)))
+            if used:
+                self.stdout.write(f"{name}: {', '.join(used)}")
+            else:
+                self.stdout.write(self.style.WARNING(f"{name}: no index"))
+            if verbose:
+                self.stdout.write(plan + "\n")
+
+
+def hot_queries(provider: Provider, client: User) -> dict[str, QuerySet]:
+    tz = provider.user.tz
+    day = datetime.now(tz=tz).date() + timedelta(days=1)
+    day_start = datetime.combine(day, time(), tzinfo=tz)
+    day_end = day_start + timedelta(days=1)
+    week_end = day_start + timedelta(days=7)
+    now = datetime.now(tz=PROVIDER_TZ)
+    clients = Reservation.objects.filter(provider=provider, client__isnull=False)
+
+    return {
+        # get_events_by_day
+        "day reservations": Reservation.objects.filter(
+            provider=provider, period__overlap=(day_start, day_end), is_canceled=False
+        ).values_list("start", "end", "service", "client"),
+        "day breaks": Break.objects.filter(provider=provider, period__overlap=(day_start, day_end)).values_list(
+            "start", "end"
+        ),
+        # ProviderDayOccupancy.objects.recompute
+        "week reservations": Reservation.objects.filter(
+            provider=provider, period__overlap=(day_start, week_end), is_canceled=False
+        ).values_list("start", "end"),
+        "week breaks": Break.objects.filter(provider=provider, period__overlap=(day_start, week_end)).values_list(
+            "start", "end"
+        ),
+        # get_occupied_minutes and get_provider_overview
+        "occupancy": ProviderDayOccupancy.objects.filter(
+            provider=provider, day__gte=day, day__lte=day + timedelta(days=7)
+        ).values_list("day", "bitmap"),
+        # get_days_off_by_provider
+        "vacations": Vacation.objects.filter(
+            provider=provider, start_date__lte=day + timedelta(days=7), end_date__gte=day
+        ).values_list("start_date", "end_date"),
+        # get_client_busy_intervals
+        "client busy": Reservation.objects.filter(
+            client=client, period__overlap=(day_start, week_end), is_canceled=False
+        ).values_list("start", "end"),
+        # get_client_summaries
+        "provider clients": clients.values_list("client").annotate(
+            past=Count("pk", filter=Q(start__lt=now)), next=Min("start", filter=Q(start__gt=now))
+        ),
+        # get_client_page
+        "client page": clients.annotate(sort_name=Coalesce("client__full_name", Value("")))
+        .values_list("sort_name", "client")
+        .distinct()
+        .order_by("sort_name", "client")[: CLIENTS_PAGE_SIZE + 1],
+    }
@@ -0,0 +1,85 @@
+# Generated by Django 5.1 on 2026-10-18 09:05
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from apps.scheduler.occupancy import lunch_interval, occupancy_bitmap, touched_days
+
+
+def fill_occupancy(apps, schema_editor):
+    Provider = apps.get_model("roles", "Provider")
+    Reservation = apps.get_model("scheduler", "Reservation")
+    Break = apps.get_model("scheduler", "Break")
+    ProviderDayOccupancy = apps.get_model("scheduler", "ProviderDayOccupancy")
+
+    for provider in Provider.objects.select_related("user").iterator():
+        tz = provider.user.tz
+        intervals = defaultdict(list)
+        reservations = defaultdict(int)
+        events = [
+            (start, end, True)
+            for start, end in Reservation.objects.filter(
+                provider=provider, is_canceled=False, start__isnull=False, end__isnull=False
+            ).values_list("start", "end")
+        ] + [
+            (start, end, False)
+            for start, end in Break.objects.filter(
+                provider=provider, start__isnull=False, end__isnull=False
+            ).values_list("start", "end")
+        ]
+        for start, end, is_reservation in events:
+            for day in touched_days(start, end, tz):
+                intervals[day].append((start, end))
+            if is_reservation:
+                reservations[start.astimezone(tz).date()] += 1
+
+        ProviderDayOccupancy.objects.bulk_create(
+            [
+                ProviderDayOccupancy(
+                    provider=provider,
+                    day=day,
+                    bitmap=occupancy_bitmap(
+                        day, tz, day_intervals + lunch_interval(day, tz, provider.lunch_start, provider.lunch_end)
+                    ),
+                    reservations=reservations[day],
+                )
+                for day, day_intervals in intervals.items()
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("roles", "0002_alter_provider_paid_until"),
+        ("scheduler", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProviderDayOccupancy",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("day", models.DateField()),
+                ("bitmap", models.BinaryField(max_length=12)),
+                ("reservations", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "provider",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occupancy",
+                        to="roles.provider",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(fields=("provider", "day"), name="unique_provider_day_occupancy")
+                ],
+            },
+        ),
+        migrations.RunPython(fill_occupancy, migrations.RunPython.noop),
+    ]
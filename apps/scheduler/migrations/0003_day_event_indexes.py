@@ -0,0 +1,30 @@
+# Generated by Django 5.1 on 2026-10-18 09:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("roles", "0002_alter_provider_paid_until"),
+        ("scheduler", "0002_provider_day_occupancy"),
+        ("services", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="break",
+            index=models.Index(fields=["provider", "end"], include=("start",), name="break_provider_end_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                condition=models.Q(("is_canceled", False)),
+                fields=["provider", "end"],
+                include=("start", "service", "client"),
+                name="reservation_provider_end_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1 on 2026-10-18 09:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("roles", "0002_alter_provider_paid_until"),
+        ("scheduler", "0003_day_event_indexes"),
+        ("services", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="break",
+            index=models.Index(fields=["provider", "start"], name="break_provider_start_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                condition=models.Q(("is_canceled", False)),
+                fields=["provider", "start", "end"],
+                name="reservation_provider_start_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(fields=["client", "start"], name="reservation_client_start_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="vacation",
+            index=models.Index(fields=["provider", "start_date", "end_date"], name="vacation_provider_dates_idx"),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.1 on 2026-10-18 09:21
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+import utils.db
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("roles", "0002_alter_provider_paid_until"),
+        ("scheduler", "0004_scheduler_query_indexes"),
+        ("services", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # GiST operator classes for the plain foreign key columns next to the ranges
+        BtreeGistExtension(),
+        migrations.RemoveIndex(
+            model_name="break",
+            name="break_provider_end_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="reservation",
+            name="reservation_provider_end_idx",
+        ),
+        migrations.AddField(
+            model_name="break",
+            name="period",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=models.Case(models.When(end__gt=models.F("start"), then=utils.db.TsTzRange("start", "end"))),
+                output_field=django.contrib.postgres.fields.ranges.DateTimeRangeField(),
+            ),
+        ),
+        migrations.AddField(
+            model_name="reservation",
+            name="period",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=models.Case(models.When(end__gt=models.F("start"), then=utils.db.TsTzRange("start", "end"))),
+                output_field=django.contrib.postgres.fields.ranges.DateTimeRangeField(),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="break",
+            index=django.contrib.postgres.indexes.GistIndex(
+                fields=["provider", "period"], name="break_provider_period_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reservation",
+            index=django.contrib.postgres.indexes.GistIndex(
+                condition=models.Q(("is_canceled", False)),
+                fields=["client", "period"],
+                name="reservation_client_period_idx",
+            ),
+        ),
+    ]
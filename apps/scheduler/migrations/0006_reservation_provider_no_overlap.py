@@ -0,0 +1,44 @@
+# Generated by Django 5.1 on 2026-10-18 11:05
+
+import django.contrib.postgres.constraints
+from django.db import migrations, models
+
+
+def check_no_double_bookings(apps, schema_editor):
+    # The exclusion constraint can't be added over double bookings, which only the operator may resolve
+    Reservation = apps.get_model("scheduler", "Reservation")
+    overlapping = Reservation.objects.filter(is_canceled=False, period__isnull=False).filter(
+        models.Exists(
+            Reservation.objects.filter(
+                provider=models.OuterRef("provider"),
+                period__overlap=models.OuterRef("period"),
+                is_canceled=False,
+            ).exclude(pk=models.OuterRef("pk"))
+        )
+    )
+    pks = list(overlapping.order_by("pk").values_list("pk", flat=True))
+    if pks:
+        raise RuntimeError(
+            f"Reservations {', '.join(map(str, pks))} overlap others of the same provider. "
+            "Review them with `python manage.py cancel_double_bookings` and resolve them, "
+            "e.g. with its --cancel option, before migrating."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("scheduler", "0005_event_periods"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_no_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="reservation",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                condition=models.Q(("is_canceled", False)),
+                expressions=[("provider", "="), ("period", "&&")],
+                name="reservation_provider_no_overlap",
+            ),
+        ),
+    ]
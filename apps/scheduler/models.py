@@ -1,9 +1,25 @@
-from django.db import models
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
+from django.contrib.postgres.indexes import GistIndex
+from django.db import models, transaction
 
 from apps.roles.models import Provider, User
+from apps.scheduler.occupancy import lunch_interval, occupancy_bitmap, touched_days
 from apps.services.models import Service
 from djmoney.models.fields import MoneyField
-from utils.db import NormalizedDateTimeField, TimeStampedModelMixin
+from utils.db import NormalizedDateTimeField, TimeStampedModelMixin, TsTzRange
+
+
+def period_field() -> models.GeneratedField:
+    # [start, end) for the overlap (&&) lookups, NULL unless the event has a positive length
+    return models.GeneratedField(
+        expression=models.Case(models.When(end__gt=models.F("start"), then=TsTzRange("start", "end"))),
+        output_field=DateTimeRangeField(),
+        db_persist=True,
+    )
 
 
 class Reservation(models.Model, TimeStampedModelMixin):
@@ -28,12 +44,47 @@ class Reservation(models.Model, TimeStampedModelMixin):
     start = NormalizedDateTimeField(null=True, blank=True)
     end = NormalizedDateTimeField(null=True, blank=True)
     is_canceled = models.BooleanField(default=False)
+    period = period_field()
+
+    class Meta:
+        constraints = [
+            # No double bookings; its GiST index serves the provider's overlap lookups as well
+            ExclusionConstraint(
+                name="reservation_provider_no_overlap",
+                expressions=[("provider", RangeOperators.EQUAL), ("period", RangeOperators.OVERLAPS)],
+                condition=models.Q(is_canceled=False),
+            ),
+        ]
+        indexes = [
+            GistIndex(
+                fields=["client", "period"],
+                condition=models.Q(is_canceled=False),
+                name="reservation_client_period_idx",
+            ),
+            # Ranges bounded by the start
+            models.Index(
+                fields=["provider", "start", "end"],
+                condition=models.Q(is_canceled=False),
+                name="reservation_provider_start_idx",
+            ),
+            # Client's own reservations: availability, upcoming and past lists
+            models.Index(fields=["client", "start"], name="reservation_client_start_idx"),
+        ]
 
     def save(self, *args, **kwargs):
         self.date = self.start.date()
         if not kwargs.get("end") and kwargs.get("is_break"):
             self.end = kwargs["provider"].break_end
-        super(Reservation, self).save(*args, **kwargs)
+        with transaction.atomic():
+            previous = Reservation.objects.filter(pk=self.pk).first() if self.pk else None
+            super(Reservation, self).save(*args, **kwargs)
+            ProviderDayOccupancy.objects.update_for(previous, self)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            deleted = super(Reservation, self).delete(*args, **kwargs)
+            ProviderDayOccupancy.objects.update_for(self)
+        return deleted
 
 
 class Vacation(models.Model, TimeStampedModelMixin):
@@ -47,6 +98,9 @@ class Vacation(models.Model, TimeStampedModelMixin):
     start_date = models.DateField(null=True, blank=True)
     end_date = models.DateField(null=True, blank=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["provider", "start_date", "end_date"], name="vacation_provider_dates_idx")]
+
 
 class Break(models.Model, TimeStampedModelMixin):
     provider = models.ForeignKey(
@@ -59,12 +113,121 @@ class Break(models.Model, TimeStampedModelMixin):
     date = models.DateField(null=True, blank=True)
     start = NormalizedDateTimeField(null=True, blank=True)
     end = NormalizedDateTimeField(null=True, blank=True)
+    period = period_field()
+
+    class Meta:
+        indexes = [
+            GistIndex(fields=["provider", "period"], name="break_provider_period_idx"),
+            models.Index(fields=["provider", "start"], name="break_provider_start_idx"),
+        ]
 
     def save(self, *args, **kwargs):
         self.date = self.start.date()
         if not kwargs.get("end") and kwargs.get("is_break"):
             self.end = kwargs["provider"].break_end
-        super(Break, self).save(*args, **kwargs)
+        with transaction.atomic():
+            previous = Break.objects.filter(pk=self.pk).first() if self.pk else None
+            super(Break, self).save(*args, **kwargs)
+            ProviderDayOccupancy.objects.update_for(previous, self)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            deleted = super(Break, self).delete(*args, **kwargs)
+            ProviderDayOccupancy.objects.update_for(self)
+        return deleted
+
+
+class ProviderDayOccupancyManager(models.Manager):
+    def update_for(self, *events: Reservation | Break | None) -> None:
+        # Recompute the days the events were and are on, e.g. the old and the new state of a rescheduled one
+        days = defaultdict(set)
+        for event in events:
+            if event and event.provider_id and event.start and event.end:
+                days[event.provider_id].add((event.start, event.end))
+        for provider_id, intervals in days.items():
+            provider = Provider.objects.select_related("user").filter(pk=provider_id).first()
+            if provider is None:
+                # Deleted along with the events, its bitmaps are gone too
+                continue
+            self.recompute(
+                provider, {day for start, end in intervals for day in touched_days(start, end, provider.user.tz)}
+            )
+
+    def recompute(self, provider: Provider, days: set[date] | list[date]) -> None:
+        """
+        Rebuild the bitmaps of the provider's local `days` from reservations, breaks and lunch hours.
+
+        The provider row is locked meanwhile, so concurrent updates of the same provider can't
+        overwrite each other with bitmaps computed from stale data.
+        """
+        if not days:
+            return
+        tz = provider.user.tz
+        range_start = datetime.combine(min(days), time(), tzinfo=tz)
+        range_end = datetime.combine(max(days) + timedelta(days=1), time(), tzinfo=tz)
+
+        with transaction.atomic():
+            Provider.objects.select_for_update().filter(pk=provider.pk).first()
+            reservations = list(
+                Reservation.objects.filter(
+                    provider=provider, period__overlap=(range_start, range_end), is_canceled=False
+                ).values_list("start", "end")
+            )
+            breaks = list(
+                Break.objects.filter(provider=provider, period__overlap=(range_start, range_end)).values_list(
+                    "start", "end"
+                )
+            )
+            self.bulk_create(
+                [
+                    ProviderDayOccupancy(
+                        provider=provider,
+                        day=day,
+                        bitmap=occupancy_bitmap(
+                            day,
+                            tz,
+                            reservations + breaks + lunch_interval(day, tz, provider.lunch_start, provider.lunch_end),
+                        ),
+                        reservations=sum(start.astimezone(tz).date() == day for start, _end in reservations),
+                    )
+                    for day in sorted(days)
+                ],
+                update_conflicts=True,
+                unique_fields=["provider", "day"],
+                update_fields=["bitmap", "reservations"],
+            )
+
+    def rebuild(self, provider: Provider, since: date) -> None:
+        # After a lunch hours or timezone change, history keeps the bitmaps it had
+        tz = provider.user.tz
+        since_start = datetime.combine(since, time(), tzinfo=tz)
+        with transaction.atomic():
+            self.filter(provider=provider, day__gte=since).delete()
+            days = set()
+            for model in (Reservation, Break):
+                events = model.objects.filter(provider=provider, end__gt=since_start).values_list("start", "end")
+                for start, end in events:
+                    days.update(day for day in touched_days(start, end, tz) if day >= since)
+            self.recompute(provider, days)
+
+
+class ProviderDayOccupancy(models.Model):
+    """
+    Busy 15-minute ticks of a provider-local day: reservations, breaks and lunch.
+
+    Days without a row never had reservations or breaks, they are busy at lunch only.
+    """
+
+    provider = models.ForeignKey(Provider, related_name="occupancy", on_delete=models.CASCADE)
+    day = models.DateField()
+    bitmap = models.BinaryField(max_length=12)
+    # Not canceled reservations starting on the day
+    reservations = models.PositiveSmallIntegerField(default=0)
+
+    objects = ProviderDayOccupancyManager()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["provider", "day"], name="unique_provider_day_occupancy")]
 
 
 # TODO: Actually implement booking reminder notifications
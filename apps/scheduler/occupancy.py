@@ -0,0 +1,67 @@
+from datetime import date, datetime, time, timedelta
+from typing import Iterable
+from zoneinfo import ZoneInfo
+
+from apps.scheduler.slots import Interval
+
+# A provider-local day in 15-minute ticks, tick `i` is bit `i` of a little-endian integer
+TICK_MINUTES = 15
+TICKS_PER_DAY = 24 * 60 // TICK_MINUTES
+BITMAP_SIZE = TICKS_PER_DAY // 8
+
+
+def touched_days(start: datetime, end: datetime, tz: ZoneInfo) -> list[date]:
+    # Local days of the `tz` an interval has at least one moment on
+    first_day = start.astimezone(tz).date()
+    last_day = (end - timedelta(microseconds=1)).astimezone(tz).date() if end > start else first_day
+    return [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+
+
+def lunch_interval(day: date, tz: ZoneInfo, lunch_start: time | None, lunch_end: time | None) -> list[Interval]:
+    if not (lunch_start and lunch_end):
+        return []
+    return [(datetime.combine(day, lunch_start, tzinfo=tz), datetime.combine(day, lunch_end, tzinfo=tz))]
+
+
+def occupancy_bitmap(day: date, tz: ZoneInfo, intervals: Iterable[Interval]) -> bytes:
+    """
+    Bitmap of the ticks of a local `day` of the `tz` touched by any of the intervals.
+
+    Ticks follow the wall clock, so on DST days a moment in the repeated hour maps to the same tick twice.
+    """
+    bits = 0
+    for start, end in intervals:
+        start, end = start.astimezone(tz), end.astimezone(tz)
+        if start.date() > day or end.date() < day or end <= start:
+            continue
+        first = 0 if start.date() < day else (start.hour * 60 + start.minute) // TICK_MINUTES
+        if end.date() > day:
+            last = TICKS_PER_DAY
+        else:
+            seconds = end.hour * 3600 + end.minute * 60 + end.second + bool(end.microsecond)
+            last = -(-seconds // (TICK_MINUTES * 60))
+        if last > first:
+            bits |= ((1 << (last - first)) - 1) << first
+    return bits.to_bytes(BITMAP_SIZE, "little")
+
+
+def tick_mask(first_minute: int, last_minute: int) -> int:
+    # Ticks touched by the wall-clock minutes [first_minute, last_minute) as bits of an integer
+    first, last = first_minute // TICK_MINUTES, -(-last_minute // TICK_MINUTES)
+    return ((1 << (last - first)) - 1) << first if last > first else 0
+
+
+def occupied_minutes(bitmap: bytes) -> list[tuple[int, int]]:
+    # Runs of set bits as wall-clock minutes since the midnight, the last one may end at the next midnight
+    bits = int.from_bytes(bitmap, "little")
+    runs = []
+    tick = 0
+    while bits >> tick:
+        if not bits >> tick & 1:
+            tick += 1
+            continue
+        first = tick
+        while tick < TICKS_PER_DAY and bits >> tick & 1:
+            tick += 1
+        runs.append((first * TICK_MINUTES, tick * TICK_MINUTES))
+    return runs
@@ -1,16 +1,46 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
 from datetime import date, datetime, time, timedelta
-from typing import Any
+from typing import NamedTuple
 from zoneinfo import ZoneInfo
 
-from django.db.models import F, Q
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, Count, Exists, Max, Min, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 
 from apps.roles.models import Provider, User
-from apps.scheduler.models import Break, Reservation, Vacation
-from utils.bot.consts import DEFAULT_SLOT
-from utils.db import normalize_time
+from apps.scheduler.models import Break, ProviderDayOccupancy, Reservation, Vacation
+from apps.scheduler.occupancy import occupied_minutes, tick_mask
+from apps.scheduler.slots import MinuteInterval, emit_slots, free_gaps, merge_intervals
+from apps.services.models import Service
+from utils.bot.consts import AVAILABILITY_SEARCH_DAYS, CLIENTS_PAGE_SIZE, DEFAULT_SLOT
+from utils.cache import VersionedCache
+from utils.misc.time import EPOCH_UTC, MINUTES_PER_DAY, day_offsets, epoch_minutes, minute_of_day
 
 PTZ = ZoneInfo("Europe/Vienna")
 
+availability_cache = VersionedCache(
+    "availability",
+    maxsize=settings.AVAILABILITY_CACHE_SIZE,
+    ttl=settings.AVAILABILITY_CACHE_TTL,
+)
+
+
+class DayEvent(NamedTuple):
+    start: datetime
+    end: datetime
+    kind: str  # RESERVATION, BREAK or LUNCH
+    service_name: str | None = None
+    client_name: str | None = None
+    client_username: str | None = None
+    client_phone: str | None = None
+
+
+RESERVATION = "reservation"
+BREAK = "break"
+LUNCH = "lunch"
+
 
 def get_events_by_day(
     day: date,
@@ -18,55 +48,241 @@ def get_events_by_day(
     day_end: datetime = None,
     provider: Provider = None,
     client: User = None,
-) -> list:
+) -> list[DayEvent]:
+    """
+    Provider's reservations, breaks and lunches (and the client's reservations, if given) overlapping the day.
+
+    Reservations and breaks come in a single UNION query of plain tuples.
+    """
     if not (day_start and day_end):
         day_start = datetime.combine(date=day, time=time(), tzinfo=provider.user.tz)
         day_end = datetime.combine(date=day + timedelta(days=1), time=time(), tzinfo=provider.user.tz)
 
-    qs = Reservation.objects.select_related("provider", "client", "service").filter(
-        Q(start__lte=day_end) & Q(end__gte=day_start),
-        is_canceled=False,
-    )
-    provider_res = qs.filter(provider=provider) if provider else Reservation.objects.none()
-    client_res = qs.filter(client=client) if client else Reservation.objects.none()
-    reservations = [
-        item
-        for item in (provider_res | client_res)
-        .annotate(
-            provider_name=F("provider__user__full_name"),
-            client_name=F("client__full_name"),
-            client_username=F("client__tg_username"),
-            client_phone=F("client__phone"),
-            service_name=F("service__name"),
+    # Both sides of the OR are foreign keys, so no row can come twice and there is nothing to DISTINCT
+    owner = Q(provider=provider) | Q(client=client) if client else Q(provider=provider)
+    no_value = Value(None, output_field=CharField())
+    reservations = Reservation.objects.filter(owner, period__overlap=(day_start, day_end), is_canceled=False)
+    breaks = Break.objects.filter(provider=provider, period__overlap=(day_start, day_end))
+    events = [
+        DayEvent(*row)
+        for row in reservations.values_list(
+            "start",
+            "end",
+            Value(RESERVATION),
+            "service__name",
+            "client__full_name",
+            "client__tg_username",
+            "client__phone",
         )
-        .distinct()
-        .values()
+        .union(breaks.values_list("start", "end", Value(BREAK), no_value, no_value, no_value, no_value), all=True)
+        .order_by("start")
     ]
 
-    breaks = [item for item in Break.objects.filter(provider=provider, start__date=day, end__date=day).values()]
+    if provider.lunch_start and provider.lunch_end:
+        # yesterday and tomorrow lunches too in case of a big timezone difference
+        start, end = epoch_minutes(day_start), epoch_minutes(day_end)
+        for _day in (day - timedelta(days=1), day, day + timedelta(days=1)):
+            offsets = day_offsets(_day, provider.user.tz)
+            lunch_start = offsets.to_utc(minute_of_day(provider.lunch_start))
+            lunch_end = offsets.to_utc(minute_of_day(provider.lunch_end))
+            if lunch_start < end and start < lunch_end:
+                events.append(
+                    DayEvent(
+                        start=EPOCH_UTC + timedelta(minutes=lunch_start),
+                        end=EPOCH_UTC + timedelta(minutes=lunch_end),
+                        kind=LUNCH,
+                    )
+                )
+
+    return sorted(events, key=lambda event: event.start)
+
+
+def get_client_busy_intervals(client: User, start: datetime, end: datetime) -> list[MinuteInterval]:
+    # Client's own reservations with any provider touching [start, end] in UTC epoch minutes
+    reservations = Reservation.objects.filter(client=client, period__overlap=(start, end), is_canceled=False)
+    return sorted(
+        (epoch_minutes(reservation_start), epoch_minutes(reservation_end))
+        for reservation_start, reservation_end in reservations.values_list("start", "end")
+    )
 
-    reserved_unsorted = reservations + breaks
 
+def get_occupied_minutes(provider: Provider, first_day: date, last_day: date) -> dict[date, list[MinuteInterval]]:
+    # Busy wall-clock minutes of the provider-local days from their occupancy bitmaps, days without one are busy
+    # at lunch only
+    bitmaps = dict(
+        ProviderDayOccupancy.objects.filter(provider=provider, day__gte=first_day, day__lte=last_day).values_list(
+            "day", "bitmap"
+        )
+    )
+    lunch = []
     if provider.lunch_start and provider.lunch_end:
-        # yesterday and tomorrow lunches too in case of a big timezone difference
-        for _day in {(day - timedelta(days=1)), day, (day + timedelta(days=1))}:
-            lunch = {
-                "start": datetime.combine(date=_day, time=provider.lunch_start, tzinfo=provider.user.tz).astimezone(
-                    tz=day_start.tzinfo
-                ),
-                "end": datetime.combine(date=_day, time=provider.lunch_end, tzinfo=provider.user.tz).astimezone(
-                    tz=day_start.tzinfo
-                ),
-                "is_lunch": True,
-            }
-            reserved_unsorted.append(lunch)
+        lunch = [(minute_of_day(provider.lunch_start), minute_of_day(provider.lunch_end))]
+
+    occupied = {}
+    day = first_day
+    while day <= last_day:
+        occupied[day] = occupied_minutes(bitmaps[day]) if day in bitmaps else lunch
+        day += timedelta(days=1)
+    return occupied
+
+
+@dataclass(frozen=True)
+class DaysOff:
+    """Provider's weekly days off and vacations over a date range, resolved without further queries."""
+
+    weekend: frozenset[int]
+    vacations: tuple[tuple[date, date], ...]  # sorted, non-overlapping, inclusive
 
-    return sorted(reserved_unsorted, key=lambda d: d["start"])
+    def is_weekend(self, day: date) -> bool:
+        return day.weekday() in self.weekend
 
+    def is_vacation(self, day: date) -> bool:
+        i = bisect_right(self.vacations, (day, date.max))
+        return bool(i) and self.vacations[i - 1][1] >= day
+
+    def __contains__(self, day: date) -> bool:
+        return self.is_weekend(day) or self.is_vacation(day)
+
+
+def get_days_off(provider: Provider, start_date: date, end_date: date) -> DaysOff:
+    return get_days_off_by_provider([provider], start_date, end_date)[provider.pk]
+
+
+def get_days_off_by_provider(providers: list[Provider], start_date: date, end_date: date) -> dict[int, DaysOff]:
+    vacations = Vacation.objects.filter(
+        provider__in=providers,
+        start_date__lte=end_date,
+        end_date__gte=start_date,
+    ).values_list("provider_id", "start_date", "end_date")
+
+    merged = {provider.pk: [] for provider in providers}
+    for provider_id, vacation_start, vacation_end in sorted(vacations):
+        provider_vacations = merged[provider_id]
+        if provider_vacations and vacation_start <= provider_vacations[-1][1] + timedelta(days=1):
+            provider_vacations[-1] = (provider_vacations[-1][0], max(provider_vacations[-1][1], vacation_end))
+        else:
+            provider_vacations.append((vacation_start, vacation_end))
+
+    return {
+        provider.pk: DaysOff(weekend=frozenset(get_weekend(provider)), vacations=tuple(merged[provider.pk]))
+        for provider in providers
+    }
+
+
+@dataclass(frozen=True)
+class ProviderDay:
+    slots: tuple[int, ...]  # UTC epoch minutes, past ones included
+    is_weekend: bool
+    is_vacation: bool
+
+
+def get_provider_days(provider: Provider, days: list[date], event_duration: int) -> dict[date, ProviderDay]:
+    """
+    Slots of the provider on the provider-local `days` for the duration regardless of who is booking and when.
+
+    Days are served from the availability cache, the missing ones are computed from occupancy bitmaps
+    and vacations covering all of them.
+    """
+    version = availability_cache.version(provider.pk)
+    result = {}
+    missed = []
+    for day in days:
+        provider_day = availability_cache.get(provider.pk, (day, event_duration), version)
+        if provider_day is None:
+            missed.append(day)
+        else:
+            result[day] = provider_day
+
+    if not missed:
+        return result
+
+    ptz = provider.user.tz
+    first_day, last_day = min(missed), max(missed)
+    days_off = get_days_off(provider, first_day, last_day)
+    occupied = get_occupied_minutes(provider, first_day, last_day)
+
+    for day in missed:
+        slots = []
+
+        if day not in days_off:
+            offsets = day_offsets(day, ptz)
+            busy = merge_intervals((offsets.to_utc(start), offsets.to_utc(end)) for start, end in occupied[day])
+            gaps = free_gaps(busy, offsets.to_utc(0), offsets.to_utc(MINUTES_PER_DAY))
+            window = (
+                offsets.to_utc(minute_of_day(provider.start)),
+                offsets.to_utc(minute_of_day(provider.end)) - event_duration,
+            )
+            slots = emit_slots(gaps, [window], event_duration)
+
+        result[day] = ProviderDay(
+            slots=tuple(slots),
+            is_weekend=days_off.is_weekend(day),
+            is_vacation=days_off.is_vacation(day),
+        )
+        availability_cache.set(provider.pk, (day, event_duration), result[day], version)
+
+    return result
+
+
+def invalidate_availability(provider_id: int) -> None:
+    availability_cache.invalidate(provider_id)
+
+
+def is_working_time(provider: Provider, start: datetime, end: datetime) -> bool:
+    # Within the provider's working hours of the provider-local day of `start` and clear of its lunch
+    offsets = day_offsets(start.astimezone(tz=provider.user.tz).date(), provider.user.tz)
+    start_minute, end_minute = epoch_minutes(start), epoch_minutes(end)
+    if start_minute < offsets.to_utc(minute_of_day(provider.start)):
+        return False
+    if end_minute > offsets.to_utc(minute_of_day(provider.end)):
+        return False
+    if provider.lunch_start and provider.lunch_end:
+        lunch_start = offsets.to_utc(minute_of_day(provider.lunch_start))
+        lunch_end = offsets.to_utc(minute_of_day(provider.lunch_end))
+        return end_minute <= lunch_start or lunch_end <= start_minute
+    return True
+
+
+def book_reservation(client: User, provider: Provider, service: Service, start: datetime) -> Reservation | None:
+    """
+    Reserve `start` for the client if it is still free, None if it was taken since the slots were shown.
+
+    Bookings of a provider are serialized by the lock on its row, taken in the same query that checks the provider's
+    reservations, breaks and vacations and the client's reservations for an overlap. The locked row is read afresh,
+    so that a change of working hours, lunch or days off made since the slots were shown is seen too.
+    The exclusion constraint on reservations stays the last line of defence.
+    """
+    end = start + timedelta(minutes=service.duration)
+    day = start.astimezone(tz=provider.user.tz).date()
+    reservations = Reservation.objects.filter(
+        Q(provider=provider) | Q(client=client), period__overlap=(start, end), is_canceled=False
+    )
+    breaks = Break.objects.filter(provider=provider, period__overlap=(start, end))
+    vacations = Vacation.objects.filter(provider=provider, start_date__lte=day, end_date__gte=day)
+
+    with transaction.atomic():
+        locked = (
+            Provider.objects.select_for_update()
+            .annotate(is_taken=Exists(reservations), is_on_break=Exists(breaks), is_vacation=Exists(vacations))
+            .get(pk=provider.pk)
+        )
+        # The user isn't locked, only its timezone is needed
+        locked.user = provider.user
+        if locked.is_taken or locked.is_on_break or locked.is_vacation or day.weekday() in get_weekend(locked):
+            return None
+        if not is_working_time(locked, start, end):
+            return None
+        reservation = Reservation(
+            client=client, provider=provider, service=service, price=service.price, start=start, end=end
+        )
+        try:
+            with transaction.atomic():
+                reservation.save()
+        except IntegrityError:
+            return None
 
-def is_vacation(tg_id: int, day: date) -> bool:
-    provider = User.objects.filter(tg_id=tg_id).first().provider
-    return Vacation.objects.filter(provider=provider, start_date__lte=day, end_date__gte=day).exists()
+    invalidate_availability(provider.pk)
+    return reservation
 
 
 def find_available_slots(
@@ -76,120 +292,213 @@ def find_available_slots(
     client: User = None,
     event_duration: int = DEFAULT_SLOT,
 ) -> tuple[list[datetime], bool, bool]:
-    tz = current_user.tz
-    now = datetime.now(tz=tz)
-    duration = timedelta(minutes=event_duration)
-    slot_duration = timedelta(minutes=event_duration)  # timedelta(minutes=provider.slot)
+    """
+    Available slots of the provider on the `day` of the current user.
 
-    day_start = max(datetime.combine(day, time(hour=0, minute=0), tzinfo=tz), normalize_time(now))
-    day_end = datetime.combine(day, time(hour=0, minute=0), tzinfo=tz) + duration
-
-    if day_end.astimezone(tz=provider.user.tz).date() <= day_start.astimezone(tz=provider.user.tz).date():
-        day_end = day_end + timedelta(days=1)
-
-    events = get_events_by_day(day=day, day_start=day_start, day_end=day_end, provider=provider, client=client)
+    Client's own reservations with any provider are excluded too.
+    """
+    ((_day, available_slots, is_weekend, is_vacation),) = find_available_days(
+        current_user=current_user,
+        provider=provider,
+        start_day=day,
+        client=client,
+        event_duration=event_duration,
+        max_days=1,
+        skip_empty_days=False,
+    )
+    return available_slots, is_weekend, is_vacation
 
-    weekend = get_weekend(provider)
 
-    available_slots = []
-    cursor = day_start
+def find_available_days(
+    current_user: User,
+    provider: Provider,
+    start_day: date,
+    client: User = None,
+    event_duration: int = DEFAULT_SLOT,
+    max_days: int = AVAILABILITY_SEARCH_DAYS,
+    limit: int = 1,
+    skip_empty_days: bool = True,
+) -> list[tuple[date, list[datetime], bool, bool]]:
+    """
+    Days with their available slots, day-off and vacation flags: up to `limit` first days with available slots among
+    `max_days` days of the current user starting from the `start_day` (all days if not `skip_empty_days`).
+
+    Everything for the whole range is fetched at once, so that skipping fully booked days and days off
+    costs no extra queries.
+    """
+    tz = current_user.tz
+    ptz = provider.user.tz
+    now = datetime.now(tz=tz)
+    last_day = start_day + timedelta(days=max_days - 1)
+    range_start = datetime.combine(start_day, time(), tzinfo=tz)
+    range_end = datetime.combine(last_day + timedelta(days=1), time(), tzinfo=tz)
+
+    # Provider-local days covering the range, including the days themselves for the day-off flags
+    first_provider_day = min(range_start.astimezone(tz=ptz).date(), start_day)
+    last_provider_day = max((range_end - timedelta(microseconds=1)).astimezone(tz=ptz).date(), last_day)
+    provider_days = get_provider_days(
+        provider,
+        [first_provider_day + timedelta(days=i) for i in range((last_provider_day - first_provider_day).days + 1)],
+        event_duration,
+    )
+    client_busy = (
+        get_client_busy_intervals(client, range_start, range_end + timedelta(minutes=event_duration)) if client else []
+    )
+    # Provider days don't overlap, so their slots chained in day order are sorted
+    slots = [slot for provider_day in sorted(provider_days) for slot in provider_days[provider_day].slots]
+    not_before = -(-int(now.timestamp()) // 60)
+
+    available_days = []
+    day = start_day
+    while day <= last_day and len(available_days) < limit:
+        offsets = day_offsets(day, tz)
+        available_slots = [
+            offsets.to_datetime(slot)
+            for slot in slots[
+                bisect_left(slots, max(offsets.to_utc(0), not_before)) : bisect_left(
+                    slots, offsets.to_utc(MINUTES_PER_DAY)
+                )
+            ]
+            if not any(start < slot + event_duration and slot < end for start, end in client_busy)
+        ]
+
+        if available_slots or not skip_empty_days:
+            available_days.append((day, available_slots, provider_days[day].is_weekend, provider_days[day].is_vacation))
+        day += timedelta(days=1)
+
+    return available_days
 
-    for event in events:
-        event_start = event["start"]
-        event_end = event["end"]
 
-        while event_start - cursor >= duration:
-            provider_start = cursor.astimezone(tz=provider.user.tz).time()
-            provider_end = (cursor + duration).astimezone(tz=provider.user.tz).time()
+def get_weekend(provider: Provider) -> list[int]:
+    weekend = sorted([int(i) for i in provider.weekend])
+    return weekend
 
-            if not (
-                cursor.astimezone(tz=provider.user.tz).weekday() in weekend
-                or cursor < now
-                or is_vacation(provider.user.tg_id, cursor.astimezone(tz=provider.user.tz).date())
-                or not (provider.start <= provider_start <= provider_end <= provider.end)
-                or not cursor.date() == day  # prevent 00:00 at the end of the time choices keyboard
-            ):
-                available_slots.append(cursor.astimezone(tz=tz))
 
-            cursor += slot_duration
-        cursor = event_end
+@dataclass(frozen=True)
+class DayOverview:
+    day: date
+    reservations: int
+    free_ratio: float  # share of the working hours not taken by lunch, breaks or reservations
+    is_weekend: bool
+    is_vacation: bool
+
+    @property
+    def emoji(self) -> str:
+        if self.reservations:
+            return "📝"
+        elif self.is_weekend:
+            return "🏠"
+        elif self.is_vacation:
+            return "🏖"
+        return "📅"
+
+
+def get_provider_overview(provider: Provider, start_date: date, end_date: date) -> list[DayOverview]:
+    """
+    Status of every provider-local day from `start_date` to `end_date` inclusive.
+
+    Reservation counts and busy time come from the occupancy rows of the range in one query,
+    days off from one more.
+    """
+    days_off = get_days_off(provider, start_date, end_date)
+    occupancy = {
+        day: (int.from_bytes(bitmap, "little"), reservations)
+        for day, bitmap, reservations in ProviderDayOccupancy.objects.filter(
+            provider=provider, day__gte=start_date, day__lte=end_date
+        ).values_list("day", "bitmap", "reservations")
+    }
+    working = tick_mask(minute_of_day(provider.start), minute_of_day(provider.end))
+    lunch = 0
+    if provider.lunch_start and provider.lunch_end:
+        lunch = tick_mask(minute_of_day(provider.lunch_start), minute_of_day(provider.lunch_end))
+
+    overview = []
+    day = start_date
+    while day <= end_date:
+        busy, reservations = occupancy.get(day, (lunch, 0))
+        free = 0 if day in days_off else (working & ~busy).bit_count()
+        overview.append(
+            DayOverview(
+                day=day,
+                reservations=reservations,
+                free_ratio=free / working.bit_count() if working else 0.0,
+                is_weekend=days_off.is_weekend(day),
+                is_vacation=days_off.is_vacation(day),
+            )
+        )
+        day += timedelta(days=1)
 
-    while cursor <= (day_end - duration):
-        provider_start = cursor.astimezone(tz=provider.user.tz).time()
-        provider_end = (cursor + duration).astimezone(tz=provider.user.tz).time()
+    return overview
 
-        if not (
-            cursor.astimezone(tz=provider.user.tz).weekday() in weekend
-            or cursor < now
-            or is_vacation(provider.user.tg_id, cursor.astimezone(tz=provider.user.tz).date())
-            or not (provider.start <= provider_start <= provider_end <= provider.end)
-            or not cursor.date() == day  # prevent 00:00 at the end of the time choices keyboard
-        ):
-            available_slots.append(cursor.astimezone(tz=tz))
 
-        cursor += slot_duration
+class ClientSummary(NamedTuple):
+    pk: int
+    full_name: str
+    tg_username: str | None
+    phone: str | None
+    past: int
+    upcoming: int
+    last: datetime | None
+    next: datetime | None
 
-    _is_day_off = day.weekday() in get_weekend(provider)
-    _is_vacation = is_vacation(provider.user.tg_id, day)
 
-    return available_slots, _is_day_off, _is_vacation
+def get_client_summaries(provider: Provider, now: datetime) -> list[ClientSummary]:
+    # The provider's clients with their reservations counted and the closest ones found, in a single GROUP BY
+    past, upcoming = Q(start__lt=now), Q(start__gt=now)
+    rows = (
+        Reservation.objects.filter(provider=provider, client__isnull=False)
+        .values_list("client", "client__full_name", "client__tg_username", "client__phone")
+        .annotate(
+            past=Count("pk", filter=past),
+            upcoming=Count("pk", filter=upcoming),
+            last=Max("start", filter=past),
+            next=Min("start", filter=upcoming),
+        )
+        .order_by("client__full_name", "client")
+    )
+    return [ClientSummary(*row) for row in rows]
 
 
-def get_weekend(provider: Provider) -> list[int]:
-    weekend = sorted([int(i) for i in provider.weekend])
-    return weekend
+class ClientPage(NamedTuple):
+    clients: list[User]
+    # Cursors of the neighbouring pages, None at either end
+    previous: str | None
+    next: str | None
 
 
-async def get_provider_week_overview(provider: Provider, offset: int = 0) -> list[dict[str, Any]]:
-    today = datetime.now(tz=provider.user.tz).date()
-    start_date = today + timedelta(days=offset)
-    end_date = start_date + timedelta(days=6)  # 7 days total, including start_date
+def get_client_page(provider: Provider, cursor: str | None = None, size: int = CLIENTS_PAGE_SIZE) -> ClientPage:
+    """
+    A page of the provider's clients ordered by (full name, pk), seeked to in the provider's reservations.
 
-    # Get all reservations in the date range
-    reservations = (
-        Reservation.objects.filter(provider=provider, start__date__gte=start_date, start__date__lte=end_date)
-        .values("start__date")
+    A cursor is ">" or "<" followed by the pk of the client the page comes after or before.
+    """
+    # Only the provider's reservations are read, through the index of the foreign key, however many users there are
+    sort_name = Coalesce("client__full_name", Value(""))
+    clients = (
+        Reservation.objects.filter(provider=provider, client__isnull=False)
+        .annotate(sort_name=sort_name)
+        .values_list("sort_name", "client")
         .distinct()
     )
-
-    # Get all vacations in the date range
-    vacations = Vacation.objects.filter(
-        start_date__lte=end_date,
-        end_date__gte=start_date,
-        provider=provider,
-    ).values("start_date", "end_date")
-
-    # Create a set of dates with reservations for faster lookup
-    reservation_dates = set(reservation["start__date"] for reservation in reservations)
-
-    # Create a set of vacation dates for faster lookup
-    vacation_dates = set()
-
-    for vacation in vacations:
-        current_date = max(vacation["start_date"], start_date)
-        while vacation["start_date"] <= current_date <= vacation["end_date"]:
-            vacation_dates.add(current_date)
-            current_date += timedelta(days=1)
-
-    # Generate the result list
-    result = []
-    days_off = get_weekend(provider)
-    for i in range(7):
-        current_date = start_date + timedelta(days=i)
-        if current_date in reservation_dates:
-            emoji = "📝"
-        elif current_date.weekday() in days_off:
-            emoji = "🏠"
-        elif current_date in vacation_dates:
-            emoji = "🏖"
-        else:
-            emoji = "📅"
-
-        result.append(
-            {
-                "date": current_date,
-                "emoji": emoji,
-            }
+    backwards = bool(cursor) and cursor[0] == "<"
+    if cursor:
+        pk = int(cursor[1:])
+        name = Subquery(
+            User.objects.filter(pk=pk).annotate(sort_name=Coalesce("full_name", Value(""))).values("sort_name")
         )
-
-    return result
+        if backwards:
+            clients = clients.filter(Q(sort_name__lt=name) | Q(sort_name=name, client__lt=pk))
+        else:
+            clients = clients.filter(Q(sort_name__gt=name) | Q(sort_name=name, client__gt=pk))
+    order = ("-sort_name", "-client") if backwards else ("sort_name", "client")
+
+    pks = [client_pk for _sort_name, client_pk in clients.order_by(*order)[: size + 1]]
+    more, pks = len(pks) > size, pks[:size]
+    users = User.objects.in_bulk(pks)
+    rows = [users[pk] for pk in (reversed(pks) if backwards else pks) if pk in users]
+    if not rows:
+        # The client in the cursor was the first or the last one and isn't anymore
+        return get_client_page(provider, size=size) if cursor else ClientPage([], None, None)
+    if backwards:
+        return ClientPage(rows, previous=f"<{rows[0].pk}" if more else None, next=f">{rows[-1].pk}")
+    return ClientPage(rows, previous=f"<{rows[0].pk}" if cursor else None, next=f">{rows[-1].pk}" if more else None)
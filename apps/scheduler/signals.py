@@ -0,0 +1,61 @@
+from datetime import datetime
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from apps.roles.models import Provider, User
+from apps.scheduler.models import ProviderDayOccupancy, Reservation
+from apps.scheduler.services import invalidate_availability
+from apps.services.models import Service
+
+
+@receiver(pre_save, sender=Provider)
+def remember_lunch(sender, instance: Provider, **kwargs):
+    instance._previous_lunch = (
+        Provider.objects.filter(pk=instance.pk).values_list("lunch_start", "lunch_end").first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Provider)
+def rebuild_occupancy_on_lunch_change(sender, instance: Provider, created: bool, **kwargs):
+    previous = getattr(instance, "_previous_lunch", None)
+    if previous and previous != (instance.lunch_start, instance.lunch_end):
+        ProviderDayOccupancy.objects.rebuild(instance, since=datetime.now(tz=instance.user.tz).date())
+
+
+@receiver(pre_save, sender=User)
+def remember_tz(sender, instance: User, **kwargs):
+    instance._previous_tz = (
+        User.objects.filter(pk=instance.pk).values_list("tz", flat=True).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=User)
+def rebuild_occupancy_on_tz_change(sender, instance: User, created: bool, **kwargs):
+    previous = getattr(instance, "_previous_tz", None)
+    if previous and str(previous) != str(instance.tz):
+        provider = Provider.objects.select_related("user").filter(user=instance).first()
+        if provider:
+            ProviderDayOccupancy.objects.rebuild(provider, since=datetime.now(tz=provider.user.tz).date())
+
+
+@receiver(pre_delete, sender=Service)
+@receiver(pre_delete, sender=User)
+def remember_cascaded_reservations(sender, instance: Service | User, **kwargs):
+    # Reservations deleted by the cascade skip Reservation.delete, so their days are recomputed afterwards
+    lookup = "service" if sender is Service else "client"
+    instance._cascaded_reservations = list(
+        Reservation.objects.filter(**{lookup: instance}, is_canceled=False).only("provider", "start", "end")
+    )
+
+
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=User)
+def recompute_occupancy_of_cascaded_reservations(sender, instance: Service | User, **kwargs):
+    # Still in the deleting transaction, one recompute per provider
+    reservations = getattr(instance, "_cascaded_reservations", [])
+    ProviderDayOccupancy.objects.update_for(*reservations)
+    for provider_id in {reservation.provider_id for reservation in reservations}:
+        transaction.on_commit(partial(invalidate_availability, provider_id))
@@ -0,0 +1,53 @@
+from datetime import datetime
+from typing import Iterable
+
+Interval = tuple[datetime, datetime]
+# The same in UTC epoch minutes, see utils.misc.time
+MinuteInterval = tuple[int, int]
+
+
+def merge_intervals(intervals: Iterable[MinuteInterval]) -> list[MinuteInterval]:
+    merged: list[MinuteInterval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_gaps(busy: list[MinuteInterval], start: int, end: int) -> list[MinuteInterval]:
+    # Every gap starts where the previous busy interval ends, even if that is before `start`:
+    # the slot grid is anchored to the gap start, the same way the old cursor walk did it.
+    gaps = []
+    cursor = start
+    for busy_start, busy_end in busy:
+        if busy_start > cursor:
+            gaps.append((cursor, busy_start))
+        cursor = busy_end
+    if end > cursor:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def emit_slots(gaps: list[MinuteInterval], windows: list[MinuteInterval], duration: int) -> list[int]:
+    """
+    Slot starts laid on a `duration` grid from the start of every free gap.
+
+    A slot is emitted if it fits into its gap and its start lies within one of the
+    (sorted, non-overlapping) windows, both ends of a window inclusive.
+    Everything is in UTC epoch minutes, so DST days need no special care.
+    """
+    slots = []
+    for gap_start, gap_end in gaps:
+        last_start = gap_end - duration
+        for window_start, window_end in windows:
+            lo = max(gap_start, window_start)
+            hi = min(last_start, window_end)
+            if lo > hi:
+                continue
+            first = -((gap_start - lo) // duration)
+            last = (hi - gap_start) // duration
+            slots.extend(range(gap_start + duration * first, gap_start + duration * last + 1, duration))
+    return slots
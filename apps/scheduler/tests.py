@@ -1,3 +1,694 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta, timezone
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from apps.roles.models import Provider, User
+from apps.scheduler.models import Break, ProviderDayOccupancy, Reservation, Vacation
+from apps.scheduler.occupancy import BITMAP_SIZE, occupancy_bitmap, occupied_minutes, tick_mask
+from apps.scheduler.services import (
+    BREAK,
+    LUNCH,
+    RESERVATION,
+    book_reservation,
+    find_available_slots,
+    get_client_page,
+    get_client_summaries,
+    get_events_by_day,
+    get_provider_overview,
+    invalidate_availability,
+)
+from apps.scheduler.slots import emit_slots, free_gaps, merge_intervals
+from apps.services.models import Service
+
+KYIV = ZoneInfo("Europe/Kyiv")
+# A Wednesday, the provider's weekend is Saturday and Sunday
+WEDNESDAY = date(2030, 1, 2)
+
+
+class BeforeDaylightSavingDays(datetime):
+    # A `now` before the 2026 transition days, so that their slots aren't in the past
+    @classmethod
+    def now(cls, tz=None):
+        return datetime(2026, 1, 1, tzinfo=timezone.utc).astimezone(tz)
+
+
+def at(day: date, hour: int, minute: int = 0) -> datetime:
+    return datetime.combine(day, time(hour, minute), tzinfo=KYIV)
+
+
+class SlotsTests(SimpleTestCase):
+    def test_merge_intervals(self):
+        self.assertEqual(merge_intervals([]), [])
+        self.assertEqual(merge_intervals([(30, 40), (0, 10), (5, 20)]), [(0, 20), (30, 40)])
+        # Touching intervals are merged, a contained one doesn't shorten its container
+        self.assertEqual(merge_intervals([(0, 10), (10, 20), (12, 15)]), [(0, 20)])
+
+    def test_free_gaps(self):
+        self.assertEqual(free_gaps([], 0, 100), [(0, 100)])
+        self.assertEqual(free_gaps([(10, 20), (50, 60)], 0, 100), [(0, 10), (20, 50), (60, 100)])
+        self.assertEqual(free_gaps([(0, 20), (80, 100)], 0, 100), [(20, 80)])
+        self.assertEqual(free_gaps([(0, 100)], 0, 100), [])
+
+    def test_free_gaps_start_after_busy_end(self):
+        # The gap starts where the busy interval ends, the slot grid is anchored to it
+        self.assertEqual(free_gaps([(-10, 5)], 0, 100), [(5, 100)])
+
+    def test_emit_slots(self):
+        gaps = free_gaps(merge_intervals([(60, 90), (30, 45)]), 0, 180)
+        self.assertEqual(gaps, [(0, 30), (45, 60), (90, 180)])
+        self.assertEqual(emit_slots(gaps, [(0, 180)], 15), [0, 15, 45, 90, 105, 120, 135, 150, 165])
+        self.assertEqual(emit_slots(gaps, [(0, 180)], 30), [0, 90, 120, 150])
+        # Both ends of a window are inclusive
+        self.assertEqual(emit_slots(gaps, [(90, 120)], 30), [90, 120])
+        self.assertEqual(emit_slots(gaps, [(100, 110)], 30), [])
+
+
+class OccupancyTests(SimpleTestCase):
+    def test_round_trip(self):
+        intervals = [
+            (at(WEDNESDAY, 9), at(WEDNESDAY, 10)),
+            (at(WEDNESDAY, 10), at(WEDNESDAY, 10, 30)),
+            # Rounded out to whole ticks
+            (at(WEDNESDAY, 13, 5), at(WEDNESDAY, 13, 50)),
+        ]
+        bitmap = occupancy_bitmap(WEDNESDAY, KYIV, intervals)
+        self.assertEqual(len(bitmap), BITMAP_SIZE)
+        self.assertEqual(occupied_minutes(bitmap), [(9 * 60, 10 * 60 + 30), (13 * 60, 14 * 60)])
+
+    def test_intervals_over_midnight(self):
+        yesterday, tomorrow = WEDNESDAY - timedelta(days=1), WEDNESDAY + timedelta(days=1)
+        intervals = [(at(yesterday, 23), at(WEDNESDAY, 1)), (at(WEDNESDAY, 23, 30), at(tomorrow, 0, 30))]
+        self.assertEqual(
+            occupied_minutes(occupancy_bitmap(WEDNESDAY, KYIV, intervals)), [(0, 60), (23 * 60 + 30, 24 * 60)]
+        )
+
+    def test_other_timezone(self):
+        # 07:00-08:00 UTC is 09:00-10:00 in Kyiv in winter
+        utc = ZoneInfo("UTC")
+        interval = (datetime.combine(WEDNESDAY, time(7), tzinfo=utc), datetime.combine(WEDNESDAY, time(8), tzinfo=utc))
+        self.assertEqual(occupied_minutes(occupancy_bitmap(WEDNESDAY, KYIV, [interval])), [(9 * 60, 10 * 60)])
+
+    def test_empty(self):
+        self.assertEqual(occupied_minutes(occupancy_bitmap(WEDNESDAY, KYIV, [])), [])
+        self.assertEqual(occupied_minutes(bytes(BITMAP_SIZE)), [])
+
+    def test_tick_mask(self):
+        self.assertEqual(tick_mask(0, 15), 0b1)
+        self.assertEqual(tick_mask(10, 35), 0b111)
+        self.assertEqual(tick_mask(30, 30), 0)
+
+
+class SchedulerTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = Provider.objects.create(
+            user=User.objects.create(username="provider", first_name="Provider", tz=KYIV),
+            start=time(9),
+            end=time(18),
+            lunch_start=time(13),
+            lunch_end=time(14),
+            weekend="56",
+        )
+        cls.service = Service.objects.create(name="Haircut", duration=60)
+        cls.service.providers.add(cls.provider)
+
+
+class EventsByDayTests(SchedulerTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.client_user = User.objects.create(
+            username="client", first_name="Client", tg_username="client", phone="+380000000000", tz=KYIV
+        )
+        cls.other_provider = Provider.objects.create(user=User.objects.create(username="other-provider", tz=KYIV))
+
+    def events(self, **kwargs) -> list[tuple]:
+        return [
+            (event.start.astimezone(KYIV).strftime("%d %H:%M"), event.end.astimezone(KYIV).strftime("%d %H:%M"))
+            + event[2:]
+            for event in get_events_by_day(WEDNESDAY, provider=self.provider, **kwargs)
+        ]
+
+    def test_day_events_in_one_query(self):
+        Reservation.objects.create(
+            client=self.client_user,
+            provider=self.provider,
+            service=self.service,
+            start=at(WEDNESDAY, 10),
+            end=at(WEDNESDAY, 11),
+        )
+        Reservation.objects.create(
+            client=self.client_user,
+            provider=self.provider,
+            start=at(WEDNESDAY, 11),
+            end=at(WEDNESDAY, 12),
+            is_canceled=True,
+        )
+        Break.objects.create(provider=self.provider, start=at(WEDNESDAY, 15), end=at(WEDNESDAY, 15, 30))
+        # Other days and other providers
+        Reservation.objects.create(
+            client=self.client_user,
+            provider=self.provider,
+            start=at(WEDNESDAY + timedelta(days=1), 10),
+            end=at(WEDNESDAY + timedelta(days=1), 11),
+        )
+        Reservation.objects.create(
+            client=self.client_user, provider=self.other_provider, start=at(WEDNESDAY, 16), end=at(WEDNESDAY, 17)
+        )
+        with self.assertNumQueries(1):
+            events = self.events()
+        self.assertEqual(
+            events,
+            [
+                ("02 10:00", "02 11:00", RESERVATION, "Haircut", "Client", "client", "+380000000000"),
+                ("02 13:00", "02 14:00", LUNCH, None, None, None, None),
+                ("02 15:00", "02 15:30", BREAK, None, None, None, None),
+            ],
+        )
+
+    def test_client_reservations_with_other_providers(self):
+        Reservation.objects.create(
+            client=self.client_user, provider=self.other_provider, start=at(WEDNESDAY, 16), end=at(WEDNESDAY, 17)
+        )
+        self.assertEqual(
+            self.events(client=self.client_user)[-1],
+            ("02 16:00", "02 17:00", RESERVATION, None, "Client", "client", "+380000000000"),
+        )
+
+    def test_events_over_midnight(self):
+        Break.objects.create(
+            provider=self.provider, start=at(WEDNESDAY - timedelta(days=1), 23), end=at(WEDNESDAY, 0, 30)
+        )
+        Reservation.objects.create(
+            client=self.client_user,
+            provider=self.provider,
+            start=at(WEDNESDAY, 23, 30),
+            end=at(WEDNESDAY + timedelta(days=1), 0, 30),
+        )
+        # Ending at the midnight doesn't overlap the day
+        Break.objects.create(provider=self.provider, start=at(WEDNESDAY - timedelta(days=1), 23), end=at(WEDNESDAY, 0))
+        self.assertEqual(
+            [event[:3] for event in self.events()],
+            [("01 23:00", "02 00:30", BREAK), ("02 13:00", "02 14:00", LUNCH), ("02 23:30", "03 00:30", RESERVATION)],
+        )
+
+    def test_lunches_of_neighbouring_days(self):
+        # A day of a client far east or west spans the lunch of the previous or the next Kyiv day
+        for tz, lunch in (
+            ("Pacific/Kiritimati", ("01 13:00", "01 14:00", LUNCH)),
+            ("America/New_York", ("02 13:00", "02 14:00", LUNCH)),
+            ("Etc/GMT+12", ("03 13:00", "03 14:00", LUNCH)),
+        ):
+            day_start = datetime.combine(WEDNESDAY, time(), tzinfo=ZoneInfo(tz))
+            events = self.events(day_start=day_start, day_end=day_start + timedelta(days=1))
+            self.assertEqual([event[:3] for event in events], [lunch], tz)
+
+
+class ProviderOverviewTests(SchedulerTestCase):
+    def test_days(self):
+        client = User.objects.create(username="client")
+        thursday, saturday, monday = (WEDNESDAY + timedelta(days=i) for i in (1, 3, 5))
+        for start in (at(WEDNESDAY, 10), at(WEDNESDAY, 16), at(saturday, 10)):
+            Reservation.objects.create(
+                client=client, provider=self.provider, start=start, end=start + timedelta(hours=1)
+            )
+        Break.objects.create(provider=self.provider, start=at(thursday, 9), end=at(thursday, 9, 30))
+        Vacation.objects.create(provider=self.provider, start_date=monday, end_date=monday)
+
+        with self.assertNumQueries(2):
+            overview = get_provider_overview(self.provider, WEDNESDAY, monday)
+        # 36 working ticks, 4 of them at lunch
+        self.assertEqual(
+            [
+                (day.day, day.reservations, round(day.free_ratio * 36), day.is_weekend, day.is_vacation)
+                for day in overview
+            ],
+            [
+                (WEDNESDAY, 2, 24, False, False),
+                (thursday, 0, 30, False, False),
+                (WEDNESDAY + timedelta(days=2), 0, 32, False, False),
+                (saturday, 1, 0, True, False),
+                (saturday + timedelta(days=1), 0, 0, True, False),
+                (monday, 0, 0, False, True),
+            ],
+        )
+        self.assertEqual([day.emoji for day in overview], ["📝", "📅", "📅", "📝", "🏠", "🏖"])
+
+    def test_without_lunch(self):
+        Provider.objects.filter(pk=self.provider.pk).update(lunch_start=None, lunch_end=None)
+        self.provider.refresh_from_db()
+        (day,) = get_provider_overview(self.provider, WEDNESDAY, WEDNESDAY)
+        self.assertEqual((day.reservations, day.free_ratio), (0, 1.0))
+
+
+class ClientSummariesTests(SchedulerTestCase):
+    def test_counts_and_closest_reservations(self):
+        zoia = User.objects.create(username="zoia", first_name="Zoia", phone="+380000000001")
+        anna = User.objects.create(username="anna", first_name="Anna", tg_username="anna")
+        bohdan = User.objects.create(username="bohdan", first_name="Bohdan")
+        other_provider = Provider.objects.create(user=User.objects.create(username="other-provider", tz=KYIV))
+        now = at(WEDNESDAY, 12)
+        for client, provider, start in (
+            (anna, self.provider, at(WEDNESDAY - timedelta(days=2), 10)),
+            (anna, self.provider, at(WEDNESDAY, 10)),
+            (anna, self.provider, at(WEDNESDAY + timedelta(days=1), 10)),
+            # Other providers' reservations don't count
+            (anna, other_provider, at(WEDNESDAY, 11)),
+            (anna, other_provider, at(WEDNESDAY, 14)),
+            (bohdan, self.provider, at(WEDNESDAY, 15)),
+            (zoia, self.provider, at(WEDNESDAY, 9)),
+            # Neither past nor upcoming
+            (zoia, self.provider, now),
+        ):
+            Reservation.objects.create(client=client, provider=provider, start=start, end=start + timedelta(hours=1))
+
+        with self.assertNumQueries(1):
+            summaries = get_client_summaries(self.provider, now)
+        self.assertEqual(
+            [tuple(summary) for summary in summaries],
+            [
+                (anna.pk, "Anna", "anna", None, 2, 1, at(WEDNESDAY, 10), at(WEDNESDAY + timedelta(days=1), 10)),
+                (bohdan.pk, "Bohdan", None, None, 0, 1, None, at(WEDNESDAY, 15)),
+                (zoia.pk, "Zoia", None, "+380000000001", 1, 0, at(WEDNESDAY, 9), None),
+            ],
+        )
+
+    def test_no_clients(self):
+        self.assertEqual(get_client_summaries(self.provider, at(WEDNESDAY, 12)), [])
+
+
+class ClientPageTests(SchedulerTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        names = ["Olena", "Anna", "", "Anna", "Bohdan", "Zoia", "Anna"]
+        cls.clients = [User.objects.create(username=f"client-{i}", first_name=name) for i, name in enumerate(names)]
+        for i, client in enumerate(cls.clients):
+            start = at(WEDNESDAY + timedelta(days=i), 10)
+            Reservation.objects.create(
+                client=client, provider=cls.provider, start=start, end=start + timedelta(hours=1)
+            )
+        # Not a client of the provider
+        User.objects.create(username="stranger", first_name="Anna")
+        cls.ordered = sorted(cls.clients, key=lambda client: (client.full_name, client.pk))
+
+    def test_pages_forward_and_backward(self):
+        pages, cursor = [], None
+        while True:
+            page = get_client_page(self.provider, cursor, size=3)
+            pages.append(page)
+            if not page.next:
+                break
+            cursor = page.next
+        self.assertEqual([client for page in pages for client in page.clients], self.ordered)
+        self.assertEqual([len(page.clients) for page in pages], [3, 3, 1])
+        self.assertIsNone(pages[0].previous)
+
+        # Back from the last page through the same pages
+        for i in range(len(pages) - 1, 0, -1):
+            page = get_client_page(self.provider, pages[i].previous, size=3)
+            self.assertEqual(page.clients, pages[i - 1].clients)
+        self.assertIsNone(page.previous)
+
+    def test_clients_with_several_reservations(self):
+        start = at(WEDNESDAY + timedelta(days=10), 10)
+        for client, is_canceled in ((self.clients[0], False), (self.clients[0], True), (self.clients[1], True)):
+            Reservation.objects.create(
+                client=client,
+                provider=self.provider,
+                start=start,
+                end=start + timedelta(hours=1),
+                is_canceled=is_canceled,
+            )
+            start += timedelta(hours=1)
+        with self.assertNumQueries(2):
+            page = get_client_page(self.provider, f">{self.ordered[2].pk}", size=3)
+        self.assertEqual(page.clients, self.ordered[3:6])
+        self.assertEqual((page.previous, page.next), (f"<{self.ordered[3].pk}", f">{self.ordered[5].pk}"))
+
+    def test_cursor_past_the_end(self):
+        last = self.ordered[-1]
+        self.assertEqual(get_client_page(self.provider, f">{last.pk}", size=3).clients, self.ordered[:3])
+
+    def test_no_clients(self):
+        provider = Provider.objects.create(user=User.objects.create(username="new-provider"))
+        page = get_client_page(provider)
+        self.assertEqual((page.clients, page.previous, page.next), ([], None, None))
+
+
+class BookReservationTests(SchedulerTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.client_user = User.objects.create(username="client", first_name="Client")
+        cls.other_client = User.objects.create(username="other-client", first_name="Other")
+
+    def book(self, start: datetime, client: User = None) -> Reservation | None:
+        return book_reservation(client or self.client_user, self.provider, self.service, start)
+
+    def test_books_a_free_slot(self):
+        reservation = self.book(at(WEDNESDAY, 10))
+        self.assertIsNotNone(reservation)
+        self.assertEqual(reservation.end, at(WEDNESDAY, 11))
+        self.assertTrue(ProviderDayOccupancy.objects.filter(provider=self.provider, day=WEDNESDAY).exists())
+
+    def test_taken_slot(self):
+        self.assertIsNotNone(self.book(at(WEDNESDAY, 10)))
+        self.assertIsNone(self.book(at(WEDNESDAY, 10, 30), client=self.other_client))
+        # Right after the first one is free
+        self.assertIsNotNone(self.book(at(WEDNESDAY, 11), client=self.other_client))
+
+    def test_canceled_reservation_frees_the_slot(self):
+        self.book(at(WEDNESDAY, 10)).delete()
+        Reservation.objects.create(
+            client=self.client_user,
+            provider=self.provider,
+            start=at(WEDNESDAY, 15),
+            end=at(WEDNESDAY, 16),
+            is_canceled=True,
+        )
+        self.assertIsNotNone(self.book(at(WEDNESDAY, 10), client=self.other_client))
+        self.assertIsNotNone(self.book(at(WEDNESDAY, 15), client=self.other_client))
+
+    def test_client_busy_with_another_provider(self):
+        other_provider = Provider.objects.create(user=User.objects.create(username="other-provider", tz=KYIV))
+        Reservation.objects.create(
+            client=self.client_user, provider=other_provider, start=at(WEDNESDAY, 10), end=at(WEDNESDAY, 11)
+        )
+        self.assertIsNone(self.book(at(WEDNESDAY, 10, 30)))
+
+    def test_break(self):
+        Break.objects.create(provider=self.provider, start=at(WEDNESDAY, 15), end=at(WEDNESDAY, 15, 30))
+        self.assertIsNone(self.book(at(WEDNESDAY, 14, 45)))
+
+    def test_days_off(self):
+        Vacation.objects.create(provider=self.provider, start_date=WEDNESDAY, end_date=WEDNESDAY)
+        self.assertIsNone(self.book(at(WEDNESDAY, 10)))
+        saturday = WEDNESDAY + timedelta(days=3)
+        self.assertIsNone(self.book(at(saturday, 10)))
+
+    def test_working_hours_and_lunch(self):
+        self.assertIsNone(self.book(at(WEDNESDAY, 8, 30)))
+        self.assertIsNone(self.book(at(WEDNESDAY, 17, 30)))
+        self.assertIsNone(self.book(at(WEDNESDAY, 12, 30)))
+        self.assertIsNotNone(self.book(at(WEDNESDAY, 17)))
+
+    def test_changed_hours_are_read_under_the_lock(self):
+        # The provider object is the one the slots were shown with
+        Provider.objects.filter(pk=self.provider.pk).update(end=time(15), lunch_start=time(11), lunch_end=time(12))
+        self.assertIsNone(self.book(at(WEDNESDAY, 15)))
+        self.assertIsNone(self.book(at(WEDNESDAY, 11)))
+        self.assertIsNotNone(self.book(at(WEDNESDAY, 13)))
+
+
+class FindAvailableSlotsTests(SchedulerTestCase):
+    """
+    The grid of a provider-local day starts at its midnight and again at the end of every busy interval.
+
+    The cursor walk before the interval engine started the grid at the end of the previous day's lunch, offering
+    09:30, 10:15... for 45 minutes instead of 09:00, 09:45...
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.client_user = User.objects.create(username="client", first_name="Client", tz=KYIV)
+
+    def slots(self, day: date = WEDNESDAY, duration: int = 60, client: User = None) -> list[str]:
+        client = client or self.client_user
+        slots, _is_weekend, _is_vacation = find_available_slots(
+            client, self.provider, day, client=client, event_duration=duration
+        )
+        return [slot.strftime("%d %H:%M") for slot in slots]
+
+    def test_plain_day(self):
+        self.assertEqual(
+            self.slots(),
+            ["02 09:00", "02 10:00", "02 11:00", "02 12:00", "02 14:00", "02 15:00", "02 16:00", "02 17:00"],
+        )
+        self.assertEqual(
+            self.slots(duration=45),
+            ["02 09:00", "02 09:45", "02 10:30", "02 11:15", "02 12:00", "02 14:00", "02 14:45", "02 15:30"]
+            + ["02 16:15", "02 17:00"],
+        )
+        self.assertEqual(self.slots(duration=90), ["02 09:00", "02 10:30", "02 14:00", "02 15:30"])
+
+    def test_without_lunch(self):
+        Provider.objects.filter(pk=self.provider.pk).update(lunch_start=None, lunch_end=None)
+        self.provider.refresh_from_db()
+        self.assertEqual(
+            self.slots(duration=90), ["02 09:00", "02 10:30", "02 12:00", "02 13:30", "02 15:00", "02 16:30"]
+        )
+
+    def test_adjacent_bookings(self):
+        for start, end in ((at(WEDNESDAY, 9), at(WEDNESDAY, 9, 45)), (at(WEDNESDAY, 9, 45), at(WEDNESDAY, 10, 30))):
+            Reservation.objects.create(client=self.client_user, provider=self.provider, start=start, end=end)
+        # The grid restarts where the second one ends, the lunch fits exactly between two slots
+        self.assertEqual(
+            self.slots(),
+            ["02 10:30", "02 11:30", "02 14:00", "02 15:00", "02 16:00", "02 17:00"],
+        )
+
+    def test_break_and_client_busy_elsewhere(self):
+        Break.objects.create(provider=self.provider, start=at(WEDNESDAY, 15), end=at(WEDNESDAY, 15, 30))
+        other_provider = Provider.objects.create(user=User.objects.create(username="other-provider", tz=KYIV))
+        Reservation.objects.create(
+            client=self.client_user, provider=other_provider, start=at(WEDNESDAY, 10, 30), end=at(WEDNESDAY, 11)
+        )
+        self.assertEqual(
+            self.slots(),
+            ["02 09:00", "02 11:00", "02 12:00", "02 14:00", "02 15:30", "02 16:30"],
+        )
+
+    def test_days_off(self):
+        Vacation.objects.create(provider=self.provider, start_date=WEDNESDAY, end_date=WEDNESDAY)
+        self.assertEqual(self.slots(), [])
+        slots, is_weekend, is_vacation = find_available_slots(self.client_user, self.provider, WEDNESDAY)
+        self.assertEqual((slots, is_weekend, is_vacation), ([], False, True))
+        slots, is_weekend, is_vacation = find_available_slots(self.client_user, self.provider, WEDNESDAY + timedelta(3))
+        self.assertEqual((slots, is_weekend, is_vacation), ([], True, False))
+
+    def test_clients_in_other_timezones(self):
+        # Kyiv is 7 hours ahead of New York and 7 hours behind Tokyo in winter
+        new_york = User.objects.create(username="new-york", tz=ZoneInfo("America/New_York"))
+        self.assertEqual(
+            self.slots(client=new_york),
+            ["02 02:00", "02 03:00", "02 04:00", "02 05:00", "02 07:00", "02 08:00", "02 09:00", "02 10:00"],
+        )
+        # The Tokyo day starts with the last slot of the previous Kyiv day
+        tokyo = User.objects.create(username="tokyo", tz=ZoneInfo("Asia/Tokyo"))
+        self.assertEqual(
+            self.slots(client=tokyo),
+            ["02 00:00", "02 16:00", "02 17:00", "02 18:00", "02 19:00", "02 21:00", "02 22:00", "02 23:00"],
+        )
+
+
+@mock.patch("apps.scheduler.services.datetime", BeforeDaylightSavingDays)
+class DaylightSavingTimeTests(TestCase):
+    """Working hours of a Kyiv provider across the 03:00 to 04:00 and 04:00 to 03:00 transitions."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = Provider.objects.create(
+            user=User.objects.create(username="provider", tz=KYIV), start=time(2), end=time(6), weekend=""
+        )
+
+    def slots(self, day: date, tz: ZoneInfo = KYIV) -> list[tuple[str, int]]:
+        client = User.objects.create(username=f"client-{tz}", tz=tz)
+        slots, _is_weekend, _is_vacation = find_available_slots(
+            client, self.provider, day, client=client, event_duration=60
+        )
+        return [(slot.strftime("%H:%M"), slot.utcoffset() // timedelta(hours=1)) for slot in slots]
+
+    def test_spring_forward(self):
+        # 3 hours of work, the skipped hour isn't offered
+        self.assertEqual(self.slots(date(2026, 3, 29)), [("02:00", 2), ("04:00", 3), ("05:00", 3)])
+        self.assertEqual(
+            self.slots(date(2026, 3, 29), ZoneInfo("UTC")), [("00:00", 0), ("01:00", 0), ("02:00", 0), ("23:00", 0)]
+        )
+
+    def test_fall_back(self):
+        # 5 hours of work, the repeated hour is offered twice
+        self.assertEqual(
+            self.slots(date(2026, 10, 25)), [("02:00", 3), ("03:00", 3), ("03:00", 2), ("04:00", 2), ("05:00", 2)]
+        )
+        self.assertEqual(
+            self.slots(date(2026, 10, 25), ZoneInfo("UTC")), [("00:00", 0), ("01:00", 0), ("02:00", 0), ("03:00", 0)]
+        )
+
+
+class AvailabilityCacheTests(SchedulerTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.client_user = User.objects.create(username="client", first_name="Client", tz=KYIV)
+
+    def slots(self) -> list[str]:
+        slots, _is_weekend, _is_vacation = find_available_slots(self.client_user, self.provider, WEDNESDAY)
+        return [slot.strftime("%H:%M") for slot in slots]
+
+    def test_days_are_served_from_the_cache(self):
+        slots = self.slots()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.slots(), slots)
+        self.assertFalse([query for query in queries.captured_queries if "scheduler_" in query["sql"]])
+
+    def test_booking_invalidates(self):
+        self.assertIn("10:00", self.slots())
+        book_reservation(self.client_user, self.provider, self.service, at(WEDNESDAY, 10))
+        self.assertNotIn("10:00", self.slots())
+
+    def test_invalidate_availability(self):
+        self.assertIn("15:00", self.slots())
+        Break.objects.create(provider=self.provider, start=at(WEDNESDAY, 15), end=at(WEDNESDAY, 16))
+        self.assertIn("15:00", self.slots())
+        invalidate_availability(self.provider.pk)
+        self.assertNotIn("15:00", self.slots())
+
+    def test_cascaded_reservations_invalidate_on_commit(self):
+        Reservation.objects.create(
+            client=self.client_user,
+            provider=self.provider,
+            service=self.service,
+            start=at(WEDNESDAY, 10),
+            end=at(WEDNESDAY, 11),
+        )
+        invalidate_availability(self.provider.pk)
+        self.assertNotIn("10:00", self.slots())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.delete()
+        self.assertIn("10:00", self.slots())
+
+
+class OccupancyUpkeepTests(SchedulerTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.client_user = User.objects.create(username="client", first_name="Client", tz=KYIV)
+
+    def occupied(self, day: date = WEDNESDAY) -> tuple[list[tuple[int, int]], int] | None:
+        occupancy = ProviderDayOccupancy.objects.filter(provider=self.provider, day=day).first()
+        return (occupied_minutes(bytes(occupancy.bitmap)), occupancy.reservations) if occupancy else None
+
+    def reserve(self, start: datetime, end: datetime) -> Reservation:
+        return Reservation.objects.create(client=self.client_user, provider=self.provider, start=start, end=end)
+
+    def test_reservation_saved_moved_and_deleted(self):
+        reservation = self.reserve(at(WEDNESDAY, 10), at(WEDNESDAY, 11))
+        self.assertEqual(self.occupied(), ([(10 * 60, 11 * 60), (13 * 60, 14 * 60)], 1))
+
+        # Both the day it leaves and the day it moves to are recomputed
+        thursday = WEDNESDAY + timedelta(days=1)
+        reservation.start, reservation.end = at(thursday, 15), at(thursday, 16)
+        reservation.save()
+        self.assertEqual(self.occupied(), ([(13 * 60, 14 * 60)], 0))
+        self.assertEqual(self.occupied(thursday), ([(13 * 60, 14 * 60), (15 * 60, 16 * 60)], 1))
+
+        reservation.delete()
+        self.assertEqual(self.occupied(thursday), ([(13 * 60, 14 * 60)], 0))
+
+    def test_canceled_reservation(self):
+        reservation = self.reserve(at(WEDNESDAY, 10), at(WEDNESDAY, 11))
+        reservation.is_canceled = True
+        reservation.save()
+        self.assertEqual(self.occupied(), ([(13 * 60, 14 * 60)], 0))
+
+    def test_reservation_over_midnight(self):
+        self.reserve(at(WEDNESDAY, 23), at(WEDNESDAY + timedelta(days=1), 1))
+        self.assertEqual(self.occupied(), ([(13 * 60, 14 * 60), (23 * 60, 24 * 60)], 1))
+        # Counted on the day it starts only
+        self.assertEqual(self.occupied(WEDNESDAY + timedelta(days=1)), ([(0, 60), (13 * 60, 14 * 60)], 0))
+
+    def test_break(self):
+        break_ = Break.objects.create(provider=self.provider, start=at(WEDNESDAY, 15), end=at(WEDNESDAY, 15, 30))
+        self.assertEqual(self.occupied(), ([(13 * 60, 14 * 60), (15 * 60, 15 * 60 + 30)], 0))
+        break_.end = at(WEDNESDAY, 16)
+        break_.save()
+        self.assertEqual(self.occupied(), ([(13 * 60, 14 * 60), (15 * 60, 16 * 60)], 0))
+        break_.delete()
+        self.assertEqual(self.occupied(), ([(13 * 60, 14 * 60)], 0))
+
+    def test_lunch_change_rebuilds_future_days(self):
+        self.reserve(at(WEDNESDAY, 10), at(WEDNESDAY, 11))
+        self.provider.lunch_start, self.provider.lunch_end = time(12), time(12, 30)
+        self.provider.save()
+        self.assertEqual(self.occupied(), ([(10 * 60, 11 * 60), (12 * 60, 12 * 60 + 30)], 1))
+
+    def test_cascaded_reservations(self):
+        Reservation.objects.create(
+            client=self.client_user,
+            provider=self.provider,
+            service=self.service,
+            start=at(WEDNESDAY, 10),
+            end=at(WEDNESDAY, 11),
+        )
+        self.service.delete()
+        self.assertEqual(self.occupied(), ([(13 * 60, 14 * 60)], 0))
+
+        self.reserve(at(WEDNESDAY, 15), at(WEDNESDAY, 16))
+        self.client_user.delete()
+        self.assertEqual(self.occupied(), ([(13 * 60, 14 * 60)], 0))
+
+
+class DoubleBookingTests(SchedulerTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.client_user = User.objects.create(username="client")
+
+    def setUp(self):
+        # Rows the constraint would reject, as they may be in a database migrated before it
+        constraint = next(
+            constraint
+            for constraint in Reservation._meta.constraints
+            if constraint.name == "reservation_provider_no_overlap"
+        )
+        with connection.schema_editor() as editor:
+            editor.remove_constraint(Reservation, constraint)
+
+    def reserve(self, start: datetime, end: datetime, **kwargs) -> Reservation:
+        kwargs.setdefault("provider", self.provider)
+        return Reservation.objects.create(client=self.client_user, start=start, end=end, **kwargs)
+
+    def check_migration(self):
+        migration = import_module("apps.scheduler.migrations.0006_reservation_provider_no_overlap")
+        migration.check_no_double_bookings(apps, connection.schema_editor())
+
+    def cancel_double_bookings(self, *args) -> str:
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("cancel_double_bookings", *args, stdout=out)
+        return out.getvalue()
+
+    def test_listed_and_canceled_on_purpose(self):
+        first = self.reserve(at(WEDNESDAY, 10), at(WEDNESDAY, 11))
+        second = self.reserve(at(WEDNESDAY, 10, 30), at(WEDNESDAY, 11, 30))
+        # Overlaps the second one only, which doesn't stay
+        third = self.reserve(at(WEDNESDAY, 11), at(WEDNESDAY, 12))
+        self.reserve(at(WEDNESDAY, 10), at(WEDNESDAY, 11), is_canceled=True)
+        other_provider = Provider.objects.create(user=User.objects.create(username="other-provider", tz=KYIV))
+        self.reserve(at(WEDNESDAY, 10), at(WEDNESDAY, 11), provider=other_provider)
+
+        with self.assertRaisesMessage(RuntimeError, f"Reservations {first.pk}, {second.pk}, {third.pk} overlap"):
+            self.check_migration()
+
+        self.assertEqual(
+            self.cancel_double_bookings().splitlines()[0], f"Reservation {second.pk} overlaps reservation {first.pk}"
+        )
+        self.assertFalse(Reservation.objects.get(pk=second.pk).is_canceled)
+
+        self.assertIn("Canceled 1 reservations", self.cancel_double_bookings("--cancel"))
+        self.assertTrue(Reservation.objects.get(pk=second.pk).is_canceled)
+        occupancy = ProviderDayOccupancy.objects.get(provider=self.provider, day=WEDNESDAY)
+        self.assertEqual(occupied_minutes(bytes(occupancy.bitmap)), [(10 * 60, 12 * 60), (13 * 60, 14 * 60)])
+        self.assertEqual(occupancy.reservations, 2)
+        self.check_migration()
+        self.assertIn("No double bookings", self.cancel_double_bookings())
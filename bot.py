@@ -1,21 +1,31 @@
 #!/usr/bin/env python
 import asyncio
 import logging
+import multiprocessing
+import multiprocessing.connection
 import os
+import signal
+import sys
 
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.utils.translation import gettext
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.dispatcher.middlewares.error import ErrorsMiddleware
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
 import environ
 from aiohttp import web
+from apps.fsm.storage import make_storage
 from dotenv import load_dotenv
 from tgbot.middlewares.debug import AllowedUsersMiddleware
+from tgbot.middlewares.deduplication import DeduplicationMiddleware
+from tgbot.middlewares.identity_map import IdentityMapMiddleware
+from tgbot.middlewares.throttling import ThrottlingMiddleware
 from utils.bot.set_bot_commands import set_default_commands
 
 load_dotenv()
@@ -39,6 +49,8 @@ BASE_WEBHOOK_URL = f"https://{HEROKU_APP_NAME}.herokuapp.com"
 WEB_SERVER_HOST = "0.0.0.0"  # TODO: Set up reverse proxy nginx or whatever
 # Port for incoming request from reverse proxy. Should be any available port
 WEB_SERVER_PORT = env.int("PORT")
+# Processes serving the webhook on the same port, each with its own database threads
+WEB_WORKERS = env.int("WEB_WORKERS", default=1)
 
 # Path to webhook route, on which Telegram will send requests
 WEBHOOK_PATH = "/webhook"
@@ -52,12 +64,12 @@ def setup_django():
     import django
 
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
-    os.environ.update({"DJANGO_ALLOW_ASYNC_UNSAFE": "true"})
 
     django.setup()
 
 
-storage = MemoryStorage()
+# Database by default, so that conversations survive restarts and are shared by the worker processes
+storage = make_storage()
 bot = Bot(
     token=TOKEN,
     default=DefaultBotProperties(parse_mode=ParseMode.HTML),
@@ -66,6 +78,26 @@ dp = Dispatcher(storage=storage)
 
 app = web.Application()
 
+deduplication = DeduplicationMiddleware(
+    window=settings.UPDATE_DEDUPLICATION_WINDOW,
+    shared_ttl=settings.UPDATE_DEDUPLICATION_TTL if settings.UPDATE_DEDUPLICATION_SHARED else None,
+)
+# Behind aiogram's errors middleware, ahead of its user and FSM context ones: the latter reads the state from storage
+aiogram_middlewares = [m for m in dp.update.outer_middleware if not isinstance(m, ErrorsMiddleware)]
+for middleware in aiogram_middlewares:
+    dp.update.outer_middleware.unregister(middleware)
+for middleware in (deduplication, *aiogram_middlewares, IdentityMapMiddleware()):
+    dp.update.outer_middleware(middleware)
+
+throttling = ThrottlingMiddleware(
+    rate_limit=settings.THROTTLING_RATE_LIMIT,
+    burst=settings.THROTTLING_BURST,
+    shared=settings.THROTTLING_SHARED,
+    store_size=settings.THROTTLING_STORE_SIZE,
+)
+dp.message.middleware(throttling)
+dp.callback_query.middleware(throttling)
+
 if settings.DEBUG:
     allowed_users = settings.ALLOWED_TG_USERS
     dp.message.middleware(AllowedUsersMiddleware(allowed_users))
@@ -119,27 +151,64 @@ async def on_startup(bot: Bot) -> None:
     )
 
 
+def start_listeners():
+    # Invalidations published by the other worker processes
+    from utils.bot.snapshots import provider_changes
+
+    provider_changes.listen()
+
+
+async def start_outbox(bot: Bot):
+    from utils.bot.outbox import outbox
+
+    # Telegram's limit is for the whole bot, the web workers split it
+    outbox.start(bot, rate=settings.OUTBOX_RATE / WEB_WORKERS)
+
+
+async def stop_outbox():
+    from utils.bot.outbox import outbox
+
+    await outbox.stop()
+    logging.info("Outbox: %s", outbox.snapshot())
+
+
+async def on_worker_shutdown():
+    from utils.bot.db_executor import db_executor
+
+    logging.info("Database executor: %s", db_executor.snapshot())
+    logging.info("Throttled updates: %s", throttling.throttled)
+    logging.info("Duplicate updates dropped: %s", deduplication.dropped)
+
+
 async def on_shutdown(bot: Bot):
     logging.info("Shutting down...")
     await bot.delete_webhook()
     logging.info("Bye!")
 
 
-def main_webhooks():
-    setup_django()
+def check_shared_state():
+    # Each worker gets a part of the updates, anything a conversation needs must be seen by all of them
+    if isinstance(dp.storage, MemoryStorage):
+        raise ImproperlyConfigured("Several web workers need a shared FSM_STORAGE, not memory")
+    if settings.CACHES["default"]["BACKEND"] == "django.core.cache.backends.locmem.LocMemCache":
+        raise ImproperlyConfigured("Several web workers need a shared CACHE_URL, not locmem")
 
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(filename)s:%(lineno)d #%(levelname)-8s [%(asctime)s] - %(name)s - %(message)s",
-    )
-    logger.info("Starting bot")
+
+def serve(worker: int):
+    logger.info("Starting web worker %s", worker)
+    start_listeners()
 
     # TODO: Figure out how to set bot commands in webhooks
 
     include_all_routers(dp)
 
-    dp.startup.register(on_startup)
-    dp.shutdown.register(on_shutdown)
+    # The webhook is set and removed once, by the first worker
+    if worker == 0:
+        dp.startup.register(on_startup)
+        dp.shutdown.register(on_shutdown)
+    dp.startup.register(start_outbox)
+    dp.shutdown.register(stop_outbox)
+    dp.shutdown.register(on_worker_shutdown)
 
     # Create an instance of request handler,
     # aiogram has few implementations for different cases of usage
@@ -155,8 +224,46 @@ def main_webhooks():
     # Mount dispatcher startup and shutdown hooks to aiohttp application
     setup_application(app, dp, bot=bot)
 
-    # And finally start webserver
-    web.run_app(app, host=WEB_SERVER_HOST, port=WEB_SERVER_PORT)
+    # And finally start webserver, the workers share the port and the kernel spreads connections among them
+    web.run_app(app, host=WEB_SERVER_HOST, port=WEB_SERVER_PORT, reuse_port=WEB_WORKERS > 1)
+
+
+def run_workers(count: int):
+    from django.db import connections
+
+    # Forked workers open their own connections, these ones mustn't be shared with them
+    connections.close_all()
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=serve, args=(number,), name=f"web-{number}") for number in range(count)]
+    for worker in workers:
+        worker.start()
+
+    # SIGTERM from the platform ends the wait below, the workers get it too
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        # Stop everything when a worker dies, so that the platform restarts the whole process
+        multiprocessing.connection.wait([worker.sentinel for worker in workers])
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+def main_webhooks():
+    setup_django()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(filename)s:%(lineno)d #%(levelname)-8s [%(asctime)s] - %(name)s - %(message)s",
+    )
+    logger.info("Starting bot")
+
+    if WEB_WORKERS > 1:
+        check_shared_state()
+        run_workers(WEB_WORKERS)
+    else:
+        serve(0)
 
 
 async def main_polling():
@@ -167,11 +274,15 @@ async def main_polling():
         format="%(filename)s:%(lineno)d #%(levelname)-8s [%(asctime)s] - %(name)s - %(message)s",
     )
     logger.info("Starting bot")
+    start_listeners()
 
     await set_default_commands()
 
     include_all_routers(dp)
 
+    dp.startup.register(start_outbox)
+    dp.shutdown.register(stop_outbox)
+
     try:
         await dp.start_polling(bot)
     finally:
@@ -48,10 +48,12 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # Third-party
     "django_extensions",
     "djmoney",
     # Proprietary
+    "apps.fsm",
     "apps.roles",
     "apps.scheduler",
     "apps.services",
@@ -112,6 +114,63 @@ if TESTING:
 else:
     DATABASES = {"default": env.db("DATABASE_URL", default="")}
 
+# Threads running the bot's database queries, i.e. at most this many connections and concurrent queries
+DB_THREADS = env.int("DB_THREADS", default=4)
+# Log a warning when a query waits longer than this many seconds for a free thread
+DB_SLOW_WAIT = env.float("DB_SLOW_WAIT", default=0.5)
+
+if env.bool("DB_POOL", default=False):
+    # psycopg's pool, Django checks a connection when taking it; it goes back when a thread is done with it
+    DATABASES["default"].setdefault("OPTIONS", {})["pool"] = {
+        "min_size": env.int("DB_POOL_MIN_SIZE", default=2),
+        "max_size": env.int("DB_POOL_MAX_SIZE", default=DB_THREADS),
+        # Seconds to wait for a connection before failing with PoolTimeout
+        "timeout": env.float("DB_POOL_TIMEOUT", default=10.0),
+    }
+else:
+    # Every database thread keeps its connection, checked before reuse
+    DATABASES["default"]["CONN_MAX_AGE"] = env.int("CONN_MAX_AGE", default=600)
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# Shared by all worker processes, so that invalidations made by one of them are seen by the others
+CACHES = {"default": env.cache("CACHE_URL", default="dbcache://django_cache")}
+
+# Slots of a provider's day, kept in every process and invalidated on reservation, break and schedule changes
+AVAILABILITY_CACHE_SIZE = env.int("AVAILABILITY_CACHE_SIZE", default=4096)
+AVAILABILITY_CACHE_TTL = env.int("AVAILABILITY_CACHE_TTL", default=15 * 60)
+# Providers' working hours and settings, evicted in every process on change over a LISTEN/NOTIFY channel
+PROVIDER_CACHE_SIZE = env.int("PROVIDER_CACHE_SIZE", default=1024)
+PROVIDER_CACHE_TTL = env.int("PROVIDER_CACHE_TTL", default=5 * 60)
+
+# Where the bot keeps conversations: "database", "memory" (lost on restart, one process only)
+# or a redis:// URL (needs the redis package)
+FSM_STORAGE = env.str("FSM_STORAGE", default="database")
+# Seconds an untouched conversation is kept
+FSM_TTL = env.int("FSM_TTL", default=7 * 24 * 60 * 60)
+
+# Seconds between a user's calls of a handler on average, unless set with utils.misc.throttling.rate_limit;
+# up to THROTTLING_BURST calls in a row go through
+THROTTLING_RATE_LIMIT = env.float("THROTTLING_RATE_LIMIT", default=0.5)
+THROTTLING_BURST = env.int("THROTTLING_BURST", default=5)
+# Users whose buckets are kept in every process
+THROTTLING_STORE_SIZE = env.int("THROTTLING_STORE_SIZE", default=10_000)
+# Share the buckets between web workers in Django's cache, at the cost of a cache round trip per update
+THROTTLING_SHARED = env.bool("THROTTLING_SHARED", default=False)
+
+# Telegram's limits for notifications sent by utils.bot.outbox: messages per second for the whole bot
+# and seconds between two messages to a chat
+OUTBOX_RATE = env.float("OUTBOX_RATE", default=30)
+OUTBOX_CHAT_INTERVAL = env.float("OUTBOX_CHAT_INTERVAL", default=1.0)
+
+# Ids of the latest updates remembered by every process, the copies Telegram resends are dropped
+UPDATE_DEDUPLICATION_WINDOW = env.int("UPDATE_DEDUPLICATION_WINDOW", default=10_000)
+# Remember them in Django's cache too, for copies delivered to another web worker
+UPDATE_DEDUPLICATION_SHARED = env.bool("UPDATE_DEDUPLICATION_SHARED", default=False)
+UPDATE_DEDUPLICATION_TTL = env.int("UPDATE_DEDUPLICATION_TTL", default=60 * 60)
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -1,3 +1,4 @@
+import itertools
 from datetime import date, datetime
 
 from aiogram import F, Router
@@ -6,7 +7,6 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import KeyboardButton, Message, ReplyKeyboardMarkup
 
-from apps.scheduler.services import get_provider_week_overview
 from bot import _
 from tgbot.filters.provider import IsProviderFilter
 from tgbot.keyboards.default import (
@@ -15,7 +15,16 @@ from tgbot.keyboards.default import (
     get_provider_breaks_days_off_menu,
     get_provider_breaks_menu,
 )
-from utils.bot.consts import DATE_FORMAT, DEFAULT_SLOT, TIME_FORMAT, TIME_INPUT_FORMAT, WDS, WDS_REV, WEEKDAYS
+from utils.bot.consts import (
+    DATE_FORMAT,
+    DAYS_OFF_EDITOR_DAYS,
+    DEFAULT_SLOT,
+    TIME_FORMAT,
+    TIME_INPUT_FORMAT,
+    WDS,
+    WDS_REV,
+    WEEKDAYS,
+)
 from utils.bot.services import (
     get_provider_breaks_as_message,
     get_provider_lunch_as_message,
@@ -28,6 +37,7 @@ from utils.bot.to_async import (
     get_available_break_hours,
     get_provider,
     get_provider_days_off,
+    get_provider_overview_by_offset,
     get_tz,
     get_upcoming_provider_breaks,
     remove_a_day_off,
@@ -366,11 +376,13 @@ async def edit_days_off(message: Message, state: FSMContext):
     else:
         await state.set_state(BreaksStatesGroup.set_day_off)
 
-    week = await get_provider_week_overview(provider, offset)
-    for day in week:
-        _date = day["date"]
-        message_list = [day["emoji"], _(WDS[_date.weekday()]), day["date"].strftime(DATE_FORMAT)]
-        markup.keyboard.append([KeyboardButton(text=" ".join(message_list))])
+    overview = await get_provider_overview_by_offset(provider, offset, days=DAYS_OFF_EDITOR_DAYS)
+    buttons = [
+        KeyboardButton(text=" ".join([day.emoji, _(WDS[day.day.weekday()]), day.day.strftime(DATE_FORMAT)]))
+        for day in overview
+    ]
+    for row in itertools.batched(buttons, 2):
+        markup.keyboard.append(list(row))
 
     markup.keyboard.append([_("Back to breaks & days off")])
     instructions = (
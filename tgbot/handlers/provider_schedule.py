@@ -20,10 +20,12 @@ from utils.bot.to_async import (
     get_available_hours,
     get_or_create_user,
     get_provider,
+    get_provider_client_page,
     get_service_data,
     get_user,
     set_reservation,
 )
+from utils.misc.throttling import rate_limit
 from utils.misc.validation import is_phone_number
 
 provider_schedule_router = Router()
@@ -118,13 +120,13 @@ async def provider_surf_reservations(message: Message, state: FSMContext):
 async def provider_new_reservation_choose_client(message: Message, state: FSMContext):
     state_data = await state.get_data()
     if message.text == _("Choose client"):
-        offset = 0
+        cursor = None
 
     elif message.text == _("Next 10"):
-        offset = state_data["offset"] + 10
+        cursor = state_data.get("clients_next")
 
     elif message.text == _("Previous 10"):
-        offset = state_data["offset"] - 10
+        cursor = state_data.get("clients_previous")
 
     elif message.text == _("New client"):
         await state.set_state(ProviderReservationsStatesGroup.set_name)
@@ -166,8 +168,9 @@ async def provider_new_reservation_choose_client(message: Message, state: FSMCon
         else:
             return await message.answer(_("You've entered something wrong. Please, try again."))
 
-    await state.update_data(offset=offset)
-    markup = await get_provider_clients_keyboard(message.from_user.id, offset=offset)
+    page = await get_provider_client_page(message.from_user.id, cursor)
+    await state.update_data(clients_previous=page.previous, clients_next=page.next)
+    markup = get_provider_clients_keyboard(page)
     await message.answer(_("Please, choose a client:"), reply_markup=markup)
 
 
@@ -231,6 +234,7 @@ async def provider_new_reservation_new_client_finish(message: Message, state: FS
     ProviderReservationsStatesGroup.choose_service,
     IsProviderFilter(),
 )
+@rate_limit(1, key="slots")
 async def provider_new_reservation_choose_datetime(message: Message, state: FSMContext):
     state_data = await state.get_data()
     provider_id = message.from_user.id
@@ -280,12 +284,15 @@ async def provider_new_reservation_choose_datetime(message: Message, state: FSMC
         date: datetime.date = state_data["date"]
         tz = provider.user.tz
         start = datetime.datetime.combine(date, datetime.time(hour=hour, minute=minute), tzinfo=tz)
-        await set_reservation(
+        reservation = await set_reservation(
             client=client,
             provider=provider,
             service_id=service_data["id"],
             start=start,
         )
+        if reservation is None:
+            await message.answer(_("This time has just been taken. Please, choose another one."))
+            return
         await state.clear()
         await message.answer(
             (
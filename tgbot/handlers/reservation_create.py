@@ -6,10 +6,19 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import KeyboardButton, Message, ReplyKeyboardMarkup
 
-from bot import _, bot
+from bot import _
 from tgbot.keyboards.default import get_client_main_menu, get_provider_services_keyboard, yes_no
 from utils.bot.consts import DATE_FORMAT, TIME_FORMAT, WDS, WEEKDAYS
-from utils.bot.to_async import get_available_hours, get_provider, get_service_data, get_user, set_reservation
+from utils.bot.outbox import outbox
+from utils.bot.to_async import (
+    get_available_days,
+    get_available_hours,
+    get_provider,
+    get_service_data,
+    get_user,
+    set_reservation,
+)
+from utils.misc.throttling import rate_limit
 
 reservation_create_router = Router()
 
@@ -43,14 +52,18 @@ async def service_selection(message: Message, state: FSMContext):
 
 
 @reservation_create_router.message(NewReservationStatesGroup.datetime_selection)
+@rate_limit(1, key="slots")
 async def datetime_selection_or_complete_booking(message: Message, state: FSMContext):
     state_data = await state.get_data()
     provider_id = int(state_data["provider_id"])
     provider = await get_provider(provider_id)
+    # Day-offs and fully booked days are skipped when moving forward
+    skip_empty_days = False
 
     if message.text == _("Next day"):
         service_name = state_data["service_name"]
         offset = state_data["offset"] + 1
+        skip_empty_days = True
         await state.update_data(offset=offset)
 
     elif message.text == _("Today"):
@@ -82,46 +95,53 @@ async def datetime_selection_or_complete_booking(message: Message, state: FSMCon
         tz = client.tz
         start = datetime.datetime.combine(date, datetime.time(hour=hour, minute=minute), tzinfo=tz)
 
-        await set_reservation(
+        reservation = await set_reservation(
             client=client,
             provider=provider,
             service_id=service_data["id"],
             start=start,
         )
-        await state.clear()
-        message_list = [
-            _("You have booked the following reservation:\n"),
-            state_data["service_name"]
-            + ", "
-            + str(service_data["price"].amount)
-            + " "
-            + str(service_data["price"].currency),
-            provider_name + ", @" + provider.user.tg_username,
-            _(WDS[date.weekday()]) + ", " + start.strftime(DATE_FORMAT) + ", " + start.strftime(TIME_FORMAT),
-        ]
-        await message.answer(
-            "\n".join(message_list),
-            reply_markup=(await get_client_main_menu(tg_id=message.from_user.id)),
-        )
-        identifier = ("@" + client.tg_username) if client.tg_username else ("#" + str(client.tg_id))
-        provider_start = start.astimezone(tz=provider.user.tz)
-        provider_notification = [
-            _("You have a new reservation:\n"),
-            state_data["service_name"],
-            client.full_name + ", " + identifier,
-            _(WDS[date.weekday()])
-            + ", "
-            + provider_start.strftime(DATE_FORMAT)
-            + ", "
-            + provider_start.strftime(TIME_FORMAT),
-        ]
-        provider_chat = await bot.get_chat(provider_id)
-        await bot.send_message(chat_id=provider_chat.id, text="\n".join(provider_notification))
-        return
+        if reservation is None:
+            # Taken meanwhile, the day's hours are shown again as they are now
+            await message.answer(_("This time has just been taken. Please, choose another one."))
+            service_name = state_data["service_name"]
+            offset = state_data["offset"]
+        else:
+            await state.clear()
+            message_list = [
+                _("You have booked the following reservation:\n"),
+                state_data["service_name"]
+                + ", "
+                + str(service_data["price"].amount)
+                + " "
+                + str(service_data["price"].currency),
+                provider_name + ", @" + provider.user.tg_username,
+                _(WDS[date.weekday()]) + ", " + start.strftime(DATE_FORMAT) + ", " + start.strftime(TIME_FORMAT),
+            ]
+            await message.answer(
+                "\n".join(message_list),
+                reply_markup=(await get_client_main_menu(tg_id=message.from_user.id)),
+            )
+            identifier = ("@" + client.tg_username) if client.tg_username else ("#" + str(client.tg_id))
+            provider_start = start.astimezone(tz=provider.user.tz)
+            provider_notification = [
+                _("You have a new reservation:\n"),
+                state_data["service_name"],
+                client.full_name + ", " + identifier,
+                _(WDS[date.weekday()])
+                + ", "
+                + provider_start.strftime(DATE_FORMAT)
+                + ", "
+                + provider_start.strftime(TIME_FORMAT),
+            ]
+            # Private chats share the ids of their users
+            outbox.send_message(provider_id, "\n".join(provider_notification))
+            return
 
     else:
         service_name = message.text.split(", ")[0]
         offset = 0 if datetime.datetime.now(tz=provider.user.tz).time() < provider.end else 1
+        skip_empty_days = True
         await state.update_data(service_name=service_name, offset=offset)
 
     state_data = await state.get_data()
@@ -134,13 +154,28 @@ async def datetime_selection_or_complete_booking(message: Message, state: FSMCon
         return
 
     client_tg_id = message.from_user.id
-    day, available_slots, is_day_off, is_vacation = await get_available_hours(
-        current_user_tg_id=client_tg_id,
-        provider_tg_id=provider_tg_id,
-        client_tg_id=client_tg_id,
-        service_name=service_name,
-        offset=offset,
-    )
+    available_days = None
+
+    if skip_empty_days:
+        available_days = await get_available_days(
+            current_user_tg_id=client_tg_id,
+            provider_tg_id=provider_tg_id,
+            client_tg_id=client_tg_id,
+            service_name=service_name,
+            offset=offset,
+        )
+
+    if available_days:
+        offset, day, available_slots = available_days[0]
+        await state.update_data(offset=offset)
+    else:
+        day, available_slots, is_day_off, is_vacation = await get_available_hours(
+            current_user_tg_id=client_tg_id,
+            provider_tg_id=provider_tg_id,
+            client_tg_id=client_tg_id,
+            service_name=service_name,
+            offset=offset,
+        )
     date = WEEKDAYS[int(day.weekday())] + ", " + day.strftime(_(DATE_FORMAT))
     markup = ReplyKeyboardMarkup(keyboard=[[]], resize_keyboard=True, one_time_keyboard=True)
 
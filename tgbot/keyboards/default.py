@@ -3,9 +3,10 @@ from datetime import time, timedelta
 from aiogram import types
 from aiogram.types import KeyboardButton
 
+from apps.scheduler.services import ClientPage
 from bot import _
 from utils.bot.consts import DEFAULT_SLOT, TIME_INPUT_FORMAT
-from utils.bot.to_async import get_provider_clients, get_provider_data, get_provider_services, is_provider
+from utils.bot.to_async import get_provider_data, get_provider_services, is_provider
 
 
 def yes_no():
@@ -80,28 +81,24 @@ def get_provider_services_menu():
     )
 
 
-async def get_provider_clients_keyboard(tg_id: int, offset: int = 0):
+def get_provider_clients_keyboard(page: ClientPage):
     markup = types.ReplyKeyboardMarkup(keyboard=[[]], resize_keyboard=True)
-    all_clients = await get_provider_clients(tg_id)
 
-    if all_clients:
-        clients = [client for client in all_clients][offset : (offset + 10)]
+    if page.previous:
+        markup.keyboard.append([KeyboardButton(text=_("Previous 10"))])
 
-        if offset:
-            markup.keyboard.append([KeyboardButton(text=_("Previous 10"))])
+    for client in page.clients:
+        if client.phone:
+            identifier = client.phone
+        elif client.tg_username:
+            identifier = f"@{client.tg_username}"
+        else:
+            identifier = f"#{client.tg_id}"
 
-        for client in clients:
-            if client.phone:
-                identifier = client.phone
-            elif client.tg_username:
-                identifier = f"@{client.tg_username}"
-            else:
-                identifier = f"#{client.tg_id}"
+        markup.keyboard.append([KeyboardButton(text=f"{client.full_name}, {identifier}")])
 
-            markup.keyboard.append([KeyboardButton(text=f"{client.full_name}, {identifier}")])
-
-        if (len(all_clients) > 1) and (all_clients[-1] != clients[-1]):
-            markup.keyboard.append([KeyboardButton(text=_("Next 10"))])
+    if page.next:
+        markup.keyboard.append([KeyboardButton(text=_("Next 10"))])
 
     markup.keyboard.append([KeyboardButton(text=_("Back to main menu"))])
     return markup
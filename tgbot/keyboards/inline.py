@@ -5,7 +5,7 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from bot import _
 from utils.bot.consts import TIME_INPUT_FORMAT
-from utils.bot.to_async import get_provider_clients, get_provider_data, get_provider_services, is_provider
+from utils.bot.to_async import get_provider_client_page, get_provider_data, get_provider_services, is_provider
 
 
 def yes_no():
@@ -100,41 +100,42 @@ async def get_client_main_menu(tg_id):
     return keyboard.as_markup()
 
 
-async def get_provider_clients_keyboard(tg_id: int, offset: int = 0):
+class ClientsPageCallback(CallbackData, prefix="clients_page"):
+    cursor: str
+
+
+async def get_provider_clients_keyboard(tg_id: int, cursor: str | None = None):
     keyboard = InlineKeyboardBuilder()
     keyboard.button(
         text=_("Get my deep link"),
         callback_data="my_deep_link",
     )
-    all_clients = [client for client in (await get_provider_clients(tg_id))]
+    page = await get_provider_client_page(tg_id, cursor)
 
-    if all_clients:
-        clients = all_clients[offset : (offset + 10)]
-
-        if offset:
-            keyboard.button(
-                text=_("Previous 10"),
-                callback_data="previous_10",
-            )
+    if page.previous:
+        keyboard.button(
+            text=_("Previous 10"),
+            callback_data=ClientsPageCallback(cursor=page.previous),
+        )
 
-        if all_clients[-1] != clients[-1]:
-            keyboard.button(
-                text=_("Next 10"),
-                callback_data="next_10",
-            )
+    if page.next:
+        keyboard.button(
+            text=_("Next 10"),
+            callback_data=ClientsPageCallback(cursor=page.next),
+        )
 
-        for client in clients:
-            if client.phone:
-                identifier = client.phone
-            elif client.tg_username:
-                identifier = f"@{client.tg_username}"
-            else:
-                identifier = f"#{client.tg_id}"
+    for client in page.clients:
+        if client.phone:
+            identifier = client.phone
+        elif client.tg_username:
+            identifier = f"@{client.tg_username}"
+        else:
+            identifier = f"#{client.tg_id}"
 
-            keyboard.button(
-                text=f"{client.full_name}",
-                callback_data=str(identifier),
-            )
+        keyboard.button(
+            text=f"{client.full_name}",
+            callback_data=str(identifier),
+        )
 
     keyboard.button(
         text=_("Back to main menu"),
@@ -0,0 +1,59 @@
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict
+
+from django.core.cache import cache
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from utils.bot.db_executor import database_sync_to_async
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateWindow:
+    """The last `size` update ids seen by the process, checked and added in O(1)."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.ids: set[int] = set()
+        self.order: deque[int] = deque()
+
+    def add(self, update_id: int) -> bool:
+        # False if the id is already in the window
+        if update_id in self.ids:
+            return False
+        self.ids.add(update_id)
+        self.order.append(update_id)
+        if len(self.order) > self.size:
+            self.ids.discard(self.order.popleft())
+        return True
+
+
+# Outer update middleware: Telegram sends an update again when the webhook responds slowly or fails,
+# its second copy mustn't book or notify twice
+class DeduplicationMiddleware(BaseMiddleware):
+    def __init__(self, window: int, shared_ttl: int | None = None):
+        self.window = UpdateWindow(window)
+        # Seconds an id is kept in Django's cache, for copies delivered to another web worker
+        self.shared_ttl = shared_ttl
+        self.dropped = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        # Marked as seen before handling, a copy arriving while the first one is still handled is dropped too
+        is_new = self.window.add(event.update_id)
+        if is_new and self.shared_ttl:
+            is_new = await database_sync_to_async(cache.add)(
+                f"update:{data['bot'].id}:{event.update_id}", 1, timeout=self.shared_ttl
+            )
+        if is_new:
+            return await handler(event, data)
+
+        self.dropped += 1
+        logger.info("Dropped a copy of update %s", event.update_id)
@@ -0,0 +1,21 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from utils.bot.identity_map import IdentityMap, identity_map
+
+
+# Outer update middleware: users and providers are loaded at most once per update by utils.bot.to_async
+class IdentityMapMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        token = identity_map.set(IdentityMap())
+        try:
+            return await handler(event, data)
+        finally:
+            identity_map.reset(token)
@@ -0,0 +1,101 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from django.core.cache import cache
+from django.utils.translation import gettext as _
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from utils.bot.db_executor import database_sync_to_async
+from utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Longer than any bucket needs to refill, a forgotten bucket is a full one
+BUCKET_TTL = 60 * 60
+
+
+def take_token(tat: float | None, now: float, interval: float, burst: int) -> float | None:
+    """
+    Token bucket kept as a single number, the time at which it will be full again (GCRA).
+
+    Returns the new time if a token is available, None if the update must be dropped.
+    """
+    tat = max(tat or now, now)
+    if tat - now > interval * (burst - 1):
+        return None
+    return tat + interval
+
+
+class LocalBuckets:
+    # Updates of a process are handled in one event loop, so nothing runs between the read and the write
+    def __init__(self, maxsize: int):
+        self.buckets = LRUCache(maxsize=maxsize, ttl=BUCKET_TTL)
+
+    async def take(self, key: str, interval: float, burst: int) -> bool:
+        tat = take_token(self.buckets.get(key), time.time(), interval, burst)
+        if tat is not None:
+            self.buckets.set(key, tat)
+        return tat is not None
+
+
+class SharedBuckets:
+    """
+    Buckets in Django's cache, seen by all web workers.
+
+    The read and the write are not atomic, concurrent updates of one user on different workers may
+    both get the last token.
+    """
+
+    async def take(self, key: str, interval: float, burst: int) -> bool:
+        return await database_sync_to_async(self._take)(key, interval, burst)
+
+    @staticmethod
+    def _take(key: str, interval: float, burst: int) -> bool:
+        now = time.time()
+        tat = take_token(cache.get(key), now, interval, burst)
+        if tat is not None:
+            cache.set(key, tat, timeout=int(tat - now) + 1)
+        return tat is not None
+
+
+# Inner middleware: drops the updates of a user calling a handler more often than `rate_limit` allows,
+# telling the user once per run of dropped messages
+class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(self, rate_limit: float, burst: int, shared: bool = False, store_size: int = 10_000):
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.buckets = SharedBuckets() if shared else LocalBuckets(maxsize=store_size)
+        # Keys told about being throttled, until an update gets through again
+        self.warned = LRUCache(maxsize=store_size, ttl=BUCKET_TTL)
+        self.throttled = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        callback = data["handler"].callback
+        # Set by utils.misc.throttling.rate_limit, handlers sharing a key share the bucket
+        interval = getattr(callback, "throttling_rate_limit", self.rate_limit)
+        if user is None or not interval:
+            return await handler(event, data)
+
+        key = f"throttling:{user.id}:{getattr(callback, 'throttling_key', callback.__name__)}"
+        if await self.buckets.take(key, interval, self.burst):
+            self.warned.delete(key)
+            return await handler(event, data)
+
+        self.throttled += 1
+        logger.debug("Throttled %s", key)
+        if isinstance(event, CallbackQuery):
+            # Stops the loading indicator on the button
+            await event.answer()
+        elif isinstance(event, Message) and not self.warned.get(key):
+            # Otherwise a booking or a cancellation tapped right after paging would be lost silently
+            self.warned.set(key, True)
+            await event.answer(_("Too many requests, please try again in a moment."))
@@ -0,0 +1,61 @@
+import asyncio
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from tgbot.middlewares.deduplication import DeduplicationMiddleware, UpdateWindow
+from tgbot.middlewares.throttling import take_token
+
+
+class TakeTokenTests(SimpleTestCase):
+    def test_burst_then_rate(self):
+        tat = None
+        for _call in range(3):
+            tat = take_token(tat, now=100.0, interval=1.0, burst=3)
+            self.assertIsNotNone(tat)
+        self.assertEqual(tat, 103.0)
+        self.assertIsNone(take_token(tat, now=100.0, interval=1.0, burst=3))
+        # A token comes back every interval
+        self.assertIsNone(take_token(tat, now=100.9, interval=1.0, burst=3))
+        self.assertEqual(take_token(tat, now=101.0, interval=1.0, burst=3), 104.0)
+
+    def test_idle_bucket_is_full(self):
+        self.assertEqual(take_token(103.0, now=200.0, interval=1.0, burst=3), 201.0)
+
+    def test_no_burst(self):
+        tat = take_token(None, now=0.0, interval=0.5, burst=1)
+        self.assertEqual(tat, 0.5)
+        self.assertIsNone(take_token(tat, now=0.25, interval=0.5, burst=1))
+        self.assertEqual(take_token(tat, now=0.5, interval=0.5, burst=1), 1.0)
+
+
+class UpdateWindowTests(SimpleTestCase):
+    def test_repeated_ids(self):
+        window = UpdateWindow(3)
+        self.assertTrue(window.add(1))
+        self.assertTrue(window.add(2))
+        self.assertFalse(window.add(1))
+        self.assertFalse(window.add(2))
+
+    def test_oldest_ids_are_forgotten(self):
+        window = UpdateWindow(3)
+        for update_id in range(1, 5):
+            self.assertTrue(window.add(update_id))
+        self.assertEqual(window.ids, {2, 3, 4})
+        self.assertTrue(window.add(1))
+        self.assertFalse(window.add(4))
+
+    def test_middleware_drops_copies(self):
+        middleware = DeduplicationMiddleware(window=10)
+        handled = []
+
+        async def handler(event, data):
+            handled.append(event.update_id)
+
+        async def run():
+            for update_id in (1, 2, 1, 3, 2):
+                await middleware(handler, SimpleNamespace(update_id=update_id), {})
+
+        asyncio.run(run())
+        self.assertEqual(handled, [1, 2, 3])
+        self.assertEqual(middleware.dropped, 2)
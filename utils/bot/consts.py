@@ -1,6 +1,12 @@
 from bot import _
 
 DEFAULT_SLOT = 30
+# How many days ahead the booking flow looks for the next day with available slots
+AVAILABILITY_SEARCH_DAYS = 30
+# How many days the days-off editor shows at once
+DAYS_OFF_EDITOR_DAYS = 28
+# Clients per page of the provider's client pickers
+CLIENTS_PAGE_SIZE = 10
 
 DATE_FORMAT = _("%m/%d/%Y")
 TIME_FORMAT = _("%I:%M %p")
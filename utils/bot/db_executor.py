@@ -0,0 +1,123 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, ParamSpec, TypeVar
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+@dataclass
+class DBExecutorStats:
+    submitted: int = 0
+    completed: int = 0
+    queued: int = 0  # waiting for a free thread right now
+    running: int = 0
+    max_queued: int = 0
+    total_wait: float = 0.0  # seconds spent in the queue by all completed calls
+    max_wait: float = 0.0
+
+
+class DBExecutor:
+    """
+    A dedicated pool of threads for blocking database work, its size capping the concurrent queries.
+
+    Calls beyond the cap wait in the pool's queue, the wait times are collected in `stats`.
+    """
+
+    def __init__(self, max_workers: int, slow_wait: float):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        self.slow_wait = slow_wait
+        self.stats = DBExecutorStats()
+        self._lock = threading.Lock()
+
+    async def run(self, func: Callable[..., R], *args, **kwargs) -> R:
+        # The context goes along for the identity map and anything else kept in context variables
+        context = contextvars.copy_context()
+        enqueued = time.monotonic()
+        with self._lock:
+            self.stats.submitted += 1
+            self.stats.queued += 1
+            self.stats.max_queued = max(self.stats.max_queued, self.stats.queued)
+
+        def call() -> R:
+            wait = time.monotonic() - enqueued
+            with self._lock:
+                self.stats.queued -= 1
+                self.stats.running += 1
+                self.stats.total_wait += wait
+                self.stats.max_wait = max(self.stats.max_wait, wait)
+            if wait > self.slow_wait:
+                logger.warning("%s waited %.3fs for a database thread", func.__qualname__, wait)
+
+            release_connection()
+            try:
+                return context.run(func, *args, **kwargs)
+            finally:
+                release_connection()
+                with self._lock:
+                    self.stats.running -= 1
+                    self.stats.completed += 1
+
+        return await asyncio.get_running_loop().run_in_executor(self.pool, call)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {**asdict(self.stats), "pool": pool_stats()}
+
+
+def release_connection() -> None:
+    """
+    What Django does around a request: drop the thread's connection if it is broken or past CONN_MAX_AGE,
+    a pooled one goes back to the pool.
+
+    Except with CONN_MAX_AGE=0 and no pool: meant for one request, it would open a connection for every call here,
+    so the thread keeps its connection until it breaks.
+    """
+    if connection.settings_dict["CONN_MAX_AGE"] or getattr(connection, "pool", None) is not None:
+        close_old_connections()
+    elif connection.connection is not None and connection.errors_occurred:
+        if not connection.is_usable():
+            connection.close()
+        connection.errors_occurred = False
+
+
+def pool_stats() -> dict[str, int] | None:
+    # Counters of psycopg's connection pool when DB_POOL is on, missing ones are zero
+    pool = getattr(connection, "pool", None)
+    if pool is None:
+        return None
+    stats = pool.get_stats()
+    return {
+        "size": stats.get("pool_size", 0),
+        # Given out or still being opened
+        "in_use": stats.get("pool_size", 0) - stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+        "requests": stats.get("requests_num", 0),
+        "queued": stats.get("requests_queued", 0),
+        "total_wait_ms": stats.get("requests_wait_ms", 0),
+        "timeouts": stats.get("requests_errors", 0),
+        "connections_failed": stats.get("connections_errors", 0),
+    }
+
+
+db_executor = DBExecutor(max_workers=settings.DB_THREADS, slow_wait=settings.DB_SLOW_WAIT)
+
+
+def database_sync_to_async(func: Callable[P, R]) -> Callable[P, Awaitable[R]]:
+    # Replacement for asgiref's sync_to_async, which runs everything in a single thread by default
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        return await db_executor.run(func, *args, **kwargs)
+
+    return wrapper
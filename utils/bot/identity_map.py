@@ -0,0 +1,57 @@
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from apps.roles.models import Provider, User
+
+
+class IdentityMap:
+    """Users loaded while handling one update, so that each row is queried at most once."""
+
+    def __init__(self):
+        self.users: dict[tuple[str, Any], "User | None"] = {}
+
+    def add(self, user: "User") -> None:
+        self.users[("tg_id", user.tg_id)] = user
+        self.users[("pk", user.pk)] = user
+
+
+# Set by IdentityMapMiddleware for the time of an update, copied into sync_to_async threads with the context
+identity_map: ContextVar[IdentityMap | None] = ContextVar("identity_map", default=None)
+
+
+def get_user_by(tg_id: int = None, pk: int = None) -> "User | None":
+    # Imported here: the middleware module using this one is imported by bot.py before Django is set up
+    from apps.roles.models import User
+
+    lookup = ("tg_id", int(tg_id)) if tg_id is not None else ("pk", int(pk))
+    current = identity_map.get()
+    if current is None:
+        return User.objects.filter(**dict([lookup])).first()
+
+    if lookup not in current.users:
+        user = User.objects.filter(**dict([lookup])).first()
+        if user:
+            current.add(user)
+        else:
+            current.users[lookup] = None
+    return current.users[lookup]
+
+
+def remember_user(user: "User") -> None:
+    # For users created or replaced during the update
+    current = identity_map.get()
+    if current is not None:
+        current.add(user)
+
+
+def get_provider_of(user: "User | None") -> "Provider | None":
+    from apps.roles.models import Provider
+
+    # The reverse one-to-one accessor caches the result on the user, a missing provider included
+    if user is None:
+        return None
+    try:
+        return user.provider
+    except Provider.DoesNotExist:
+        return None
@@ -0,0 +1,180 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+from django.conf import settings
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+logger = logging.getLogger(__name__)
+
+# Sends waiting for Telegram's response at the same time
+MAX_IN_FLIGHT = 10
+# Network and server errors before a message is given up, retried after 2, 4, 8... seconds
+MAX_ATTEMPTS = 5
+# Seconds the shutdown waits for the queue to empty
+DRAIN_TIMEOUT = 10
+
+
+@dataclass
+class OutgoingMessage:
+    text: str
+    kwargs: dict[str, Any]
+    coalesce_key: str | None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+@dataclass
+class OutboxStats:
+    enqueued: int = 0
+    sent: int = 0
+    coalesced: int = 0  # replaced by a newer message before being sent
+    retried: int = 0
+    failed: int = 0
+    queued: int = 0  # waiting to be sent right now
+    total_delay: float = 0.0  # seconds from enqueueing to delivery of all sent messages
+    max_delay: float = 0.0
+
+
+class Outbox:
+    """
+    Messages the bot sends on its own, e.g. notifications to providers, delivered in the background.
+
+    A chat gets a message at most every `chat_interval` seconds and the whole bot `rate` messages per second,
+    Telegram's limits; `RetryAfter` postpones the chat by the time Telegram asks for.
+    Messages of a chat are sent in order.
+    """
+
+    def __init__(self, chat_interval: float):
+        self.chat_interval = chat_interval
+        self.rate = 1.0
+        self.stats = OutboxStats()
+        # Chats with messages to send or sent to less than `chat_interval` ago
+        self.chats: dict[int, deque[OutgoingMessage]] = {}
+        # (time, order, chat id): when each chat, not being sent to right now, may get its next message
+        self.ready: list[tuple[float, int, int]] = []
+        self._order = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._in_flight: set[asyncio.Task] = set()
+        self._bot: Bot | None = None
+        self._task: asyncio.Task | None = None
+
+    def send_message(self, chat_id: int, text: str, coalesce_key: str | None = None, **kwargs) -> None:
+        # A pending message with the same `coalesce_key` is replaced, e.g. a status shown to the chat
+        queue = self.chats.get(chat_id)
+        if queue is not None and coalesce_key is not None:
+            for pending in queue:
+                if pending.coalesce_key == coalesce_key:
+                    pending.text, pending.kwargs = text, kwargs
+                    self.stats.coalesced += 1
+                    return
+
+        if queue is None:
+            queue = self.chats[chat_id] = deque()
+            self._schedule(chat_id, time.monotonic())
+        queue.append(OutgoingMessage(text, kwargs, coalesce_key))
+        self.stats.enqueued += 1
+        self.stats.queued += 1
+
+    def start(self, bot: Bot, rate: float) -> None:
+        self._bot = bot
+        self.rate = rate
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(self._drained(), DRAIN_TIMEOUT)
+        if self.stats.queued:
+            logger.warning("%s messages left unsent", self.stats.queued)
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+
+    def snapshot(self) -> dict[str, Any]:
+        return {**asdict(self.stats), "in_flight": len(self._in_flight)}
+
+    def _schedule(self, chat_id: int, at: float) -> None:
+        heapq.heappush(self.ready, (at, next(self._order), chat_id))
+        self._wakeup.set()
+
+    async def _drained(self) -> None:
+        while self.stats.queued or self._in_flight:
+            await asyncio.sleep(0.1)
+
+    async def _run(self) -> None:
+        slots = asyncio.Semaphore(MAX_IN_FLIGHT)
+        next_send = 0.0
+        while True:
+            self._wakeup.clear()
+            if not self.ready:
+                await self._wakeup.wait()
+                continue
+            at, _order, chat_id = self.ready[0]
+            wait = max(at, next_send) - time.monotonic()
+            if wait > 0:
+                # Or less, when a message for another chat comes in
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                continue
+
+            heapq.heappop(self.ready)
+            queue = self.chats[chat_id]
+            if not queue:
+                # Nothing new since the last message, the chat may get the next one right away
+                del self.chats[chat_id]
+                continue
+
+            await slots.acquire()
+            next_send = time.monotonic() + 1 / self.rate
+            self.stats.queued -= 1
+            task = asyncio.create_task(self._deliver(chat_id, queue.popleft()))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+            task.add_done_callback(lambda _task: slots.release())
+
+    async def _deliver(self, chat_id: int, message: OutgoingMessage) -> None:
+        delay = self.chat_interval
+        try:
+            await self._bot.send_message(chat_id=chat_id, text=message.text, **message.kwargs)
+        except TelegramRetryAfter as e:
+            delay = e.retry_after
+            self._retry(chat_id, message)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            message.attempts += 1
+            if message.attempts < MAX_ATTEMPTS:
+                delay = 2**message.attempts
+                self._retry(chat_id, message)
+            else:
+                self.stats.failed += 1
+                logger.error("Gave up sending to %s: %s", chat_id, e)
+        except TelegramAPIError as e:
+            # Blocked by the user, a deleted chat and the like, sending again won't help
+            self.stats.failed += 1
+            logger.warning("Failed to send to %s: %s", chat_id, e)
+        except Exception:
+            # A bug or an unexpected error of the client, dropped so that it can't stop the chat's queue
+            self.stats.failed += 1
+            logger.exception("Dropped a message to %s", chat_id)
+        else:
+            sent_in = time.monotonic() - message.enqueued_at
+            self.stats.sent += 1
+            self.stats.total_delay += sent_in
+            self.stats.max_delay = max(self.stats.max_delay, sent_in)
+        finally:
+            self._schedule(chat_id, time.monotonic() + delay)
+
+    def _retry(self, chat_id: int, message: OutgoingMessage) -> None:
+        self.chats[chat_id].appendleft(message)
+        self.stats.retried += 1
+        self.stats.queued += 1
+
+
+outbox = Outbox(chat_interval=settings.OUTBOX_CHAT_INTERVAL)
@@ -1,10 +1,9 @@
+from apps.scheduler.services import LUNCH, RESERVATION
 from bot import _
-from moneyed import format_money
 from utils.bot.consts import DATE_FORMAT, DATE_TIME_FORMAT, TIME_FORMAT, WDS, WEEKDAYS
 from utils.bot.to_async import (
-    count_client_reservations_by_pk,
     get_client_reservations,
-    get_provider_clients,
+    get_provider_client_summaries,
     get_provider_data,
     get_provider_events_by_offset,
     get_provider_services,
@@ -15,8 +14,6 @@ from utils.bot.to_async import (
     is_provider,
     is_vacation,
     is_weekend,
-    last_client_reservation,
-    next_client_reservation,
 )
 
 
@@ -24,10 +21,12 @@ async def get_provider_services_as_message(tg_id: int) -> str:
     services = await get_provider_services(tg_id)
     reply_message_list = []
     if services:
+        locale = (await get_user(tg_id)).locale
+        show_inactive = await is_provider(tg_id)
         for service in services:
-            price = format_money(service.price, locale=(await get_user(tg_id)).locale)
+            price = service.formatted_price(locale)
             to_message: str = service.name + "\n" + str(service.duration) + " " + _("minutes\n") + price + "\n"
-            if await is_provider(tg_id) and not service.is_active:
+            if show_inactive and not service.is_active:
                 to_message += _("(inactive)") + "\n"
             reply_message_list.append(to_message)
         return "\n".join(reply_message_list)
@@ -67,23 +66,14 @@ async def get_client_reservations_as_message(tg_id: int, is_past: bool = False)
 
 async def get_provider_clients_as_message(tg_id: id) -> str:
     tz = await get_tz(tg_id)
-    clients = await get_provider_clients(tg_id)
+    clients = await get_provider_client_summaries(tg_id)
     if clients:
         answer_message_list = []
         for client in clients:
             username = ("📱 @" + client.tg_username + "\n") if client.tg_username else ""
             phone = ("☎️ " + client.phone) if client.phone else ""
-            (past_reservations_count, upcoming_reservations_count) = await count_client_reservations_by_pk(
-                tg_id, client.pk
-            )
-            last_reservation = await last_client_reservation(client.pk)
-            last_reservation_str = (
-                (last_reservation.start.astimezone(tz).strftime(DATE_TIME_FORMAT)) if last_reservation else "-\n"
-            )
-            next_reservation = await next_client_reservation(client.pk)
-            next_reservation_str = (
-                (next_reservation.start.astimezone(tz).strftime(DATE_TIME_FORMAT)) if next_reservation else "-\n"
-            )
+            last_reservation_str = client.last.astimezone(tz).strftime(DATE_TIME_FORMAT) if client.last else "-\n"
+            next_reservation_str = client.next.astimezone(tz).strftime(DATE_TIME_FORMAT) if client.next else "-\n"
             answer_message_list.append(
                 "👤 "
                 + client.full_name
@@ -92,10 +82,10 @@ async def get_provider_clients_as_message(tg_id: id) -> str:
                 + phone
                 + "\n⏪ "
                 + _("Past reservations: ")
-                + str(past_reservations_count)
+                + str(client.past)
                 + "\n⏩ "
                 + _("Upcoming reservations: ")
-                + str(upcoming_reservations_count)
+                + str(client.upcoming)
                 + "\n⏮ "
                 + _("Last reservation: ")
                 + last_reservation_str
@@ -118,7 +108,7 @@ async def get_provider_events_as_message(tg_id: int, offset: int) -> str:
         events_list.append(_("No appointments."))
 
     for event in events:
-        time = f'⌚️ {event["start"].astimezone(tz).strftime(TIME_FORMAT)} - {event["end"].astimezone(tz).strftime(TIME_FORMAT)}\n'
+        time = f"⌚️ {event.start.astimezone(tz).strftime(TIME_FORMAT)} - {event.end.astimezone(tz).strftime(TIME_FORMAT)}\n"
         _is_weekend = await is_weekend(tg_id, day)
         _is_vacation = await is_vacation(tg_id, day)
         if _is_weekend:
@@ -126,13 +116,13 @@ async def get_provider_events_as_message(tg_id: int, offset: int) -> str:
         elif _is_vacation:
             events_list.append(_("You have a vacation."))
         else:
-            if "client_name" in event:
-                service = event["service_name"] + "\n"
-                name = "👤 " + event["client_name"] + "\n"
-                username = (", @" + event["client_username"] + "\n") if event.get("client_username") else ""
-                phone = ("☎️ " + event["client_phone"] + "\n") if event.get("client_phone") else ""
+            if event.kind == RESERVATION:
+                service = event.service_name + "\n"
+                name = "👤 " + event.client_name + "\n"
+                username = (", @" + event.client_username + "\n") if event.client_username else ""
+                phone = ("☎️ " + event.client_phone + "\n") if event.client_phone else ""
                 events_list.append(time + "📝 " + service + name + username + phone)
-            elif event.get("is_lunch", False):
+            elif event.kind == LUNCH:
                 pass
             else:
                 events_list.append(time + "⏳ " + _("Break") + "\n")  # TODO: add break description field
@@ -0,0 +1,105 @@
+from dataclasses import dataclass, field
+from datetime import time
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+
+from apps.services.models import Service
+from moneyed import Money, format_money
+from utils.bot.identity_map import get_provider_of, get_user_by
+from utils.cache import InvalidationChannel, LRUCache
+
+provider_snapshots = LRUCache(maxsize=settings.PROVIDER_CACHE_SIZE, ttl=settings.PROVIDER_CACHE_TTL)
+service_catalogs = LRUCache(maxsize=settings.PROVIDER_CACHE_SIZE, ttl=settings.PROVIDER_CACHE_TTL)
+# Keys are "<kind>:<provider's Telegram ID>", every cache evicts the keys it has
+provider_changes = InvalidationChannel("provider_changes")
+provider_changes.subscribe(provider_snapshots)
+provider_changes.subscribe(service_catalogs)
+
+
+@dataclass(frozen=True)
+class ProviderSnapshot:
+    pk: int
+    tg_id: int
+    start: time
+    end: time
+    lunch_start: time | None
+    lunch_end: time | None
+    weekend: str
+    slot: int
+    currency: str
+    tz: ZoneInfo
+
+
+def get_provider_snapshot(tg_id: int) -> ProviderSnapshot | None:
+    # Cached by Telegram ID, as the bot looks providers up by it
+    key = f"provider:{tg_id}"
+    snapshot = provider_snapshots.get(key)
+    if snapshot is None:
+        provider = get_provider_of(get_user_by(tg_id=tg_id))
+        if provider is None:
+            return None
+        snapshot = ProviderSnapshot(
+            pk=provider.pk,
+            tg_id=provider.user.tg_id,
+            start=provider.start,
+            end=provider.end,
+            lunch_start=provider.lunch_start,
+            lunch_end=provider.lunch_end,
+            weekend=provider.weekend,
+            slot=provider.slot,
+            currency=str(provider.currency),
+            tz=provider.user.tz,
+        )
+        provider_snapshots.set(key, snapshot)
+    return snapshot
+
+
+def invalidate_provider_snapshot(tg_id: int) -> None:
+    provider_changes.publish(f"provider:{tg_id}")
+
+
+@dataclass(frozen=True)
+class ServiceSnapshot:
+    id: int
+    name: str
+    duration: int
+    price: Money
+    is_active: bool
+    # Formatted price by locale, for the bot's languages
+    prices: dict[str, str] = field(default_factory=dict, compare=False)
+
+    def formatted_price(self, locale: str | None) -> str:
+        if locale in self.prices:
+            return self.prices[locale]
+        return format_money(self.price, locale=locale)
+
+
+def get_service_catalog(tg_id: int) -> tuple[ServiceSnapshot, ...]:
+    # All services of the provider, active and inactive, in the order they were created
+    key = f"services:{tg_id}"
+    catalog = service_catalogs.get(key)
+    if catalog is None:
+        provider = get_provider_of(get_user_by(tg_id=tg_id))
+        services = Service.objects.filter(providers=provider).order_by("pk") if provider else []
+        catalog = tuple(
+            ServiceSnapshot(
+                id=service.pk,
+                name=service.name,
+                duration=service.duration,
+                price=service.price,
+                is_active=service.is_active,
+                prices={locale: format_money(service.price, locale=locale) for locale in settings.LANGUAGES_CODES},
+            )
+            for service in services
+        )
+        service_catalogs.set(key, catalog)
+    return catalog
+
+
+def get_catalog_service(tg_id: int, name: str) -> ServiceSnapshot | None:
+    return next((service for service in get_service_catalog(tg_id) if service.name == name), None)
+
+
+def invalidate_service_catalog(tg_id: int) -> None:
+    provider_changes.publish(f"services:{tg_id}")
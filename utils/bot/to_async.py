@@ -1,19 +1,42 @@
 import random
 import string
+from dataclasses import asdict
 from datetime import date, datetime, time, timedelta
 from decimal import Decimal
+from functools import partial
 from typing import Any, Union
 from zoneinfo import ZoneInfo
 
+from django.db import transaction
 from django.db.models import F, Q, QuerySet
-from django.forms import model_to_dict
 
 from apps.roles.models import Provider, User
 from apps.scheduler.models import Break, Reservation, Vacation
-from apps.scheduler.services import find_available_slots, get_events_by_day
+from apps.scheduler.services import (
+    ClientPage,
+    ClientSummary,
+    DayOverview,
+    book_reservation,
+    find_available_days,
+    find_available_slots,
+    get_client_page,
+    get_client_summaries,
+    get_events_by_day,
+    get_provider_overview,
+    invalidate_availability,
+)
 from apps.services.models import Service
-from asgiref.sync import sync_to_async
 from moneyed import Currency
+from utils.bot.db_executor import database_sync_to_async
+from utils.bot.identity_map import get_provider_of, get_user_by, remember_user
+from utils.bot.snapshots import (
+    ServiceSnapshot,
+    get_catalog_service,
+    get_provider_snapshot,
+    get_service_catalog,
+    invalidate_provider_snapshot,
+    invalidate_service_catalog,
+)
 
 
 def get_random_username():
@@ -21,13 +44,13 @@ def get_random_username():
     return "".join(random.choice(symbols) for _ in range(7))
 
 
-@sync_to_async
+@database_sync_to_async
 def get_user(tg_id: int = None, user_id: int = None, username: str = None, phone: str = None) -> User | None:
     user = None
     if tg_id:
-        user = User.objects.filter(tg_id=tg_id).first()
+        user = get_user_by(tg_id=tg_id)
     if user_id:
-        user = User.objects.filter(id=user_id).first()
+        user = get_user_by(pk=user_id)
     if username:
         user = User.objects.filter(username=username).first()
     if phone:
@@ -35,7 +58,7 @@ def get_user(tg_id: int = None, user_id: int = None, username: str = None, phone
     return user
 
 
-@sync_to_async
+@database_sync_to_async
 def get_or_create_user(
     first_name: str,
     last_name: str = None,
@@ -48,7 +71,7 @@ def get_or_create_user(
 ) -> User:
     if tg_id:
         print(1)
-        user = User.objects.filter(tg_id=tg_id).first()
+        user = get_user_by(tg_id=tg_id)
         if user:
             return user
     elif phone:
@@ -77,10 +100,11 @@ def get_or_create_user(
         provider_created=provider_created,
     )
     user.save()
+    remember_user(user)
     return user
 
 
-@sync_to_async
+@database_sync_to_async
 def create_user(
     first_name: str,
     last_name: str,
@@ -100,68 +124,67 @@ def create_user(
         tz=tz,
     )
     user.save()
+    remember_user(user)
     return user
 
 
-@sync_to_async
+@database_sync_to_async
 def check_user_exists(username: str = None, phone: str = None) -> bool:
     return User.objects.filter(Q(username=username) | Q(tg_username=username) | Q(phone=phone)).exists()
 
 
-@sync_to_async
+@database_sync_to_async
 def update_user(tg_id: int, **kwargs) -> User | None:
-    user = User.objects.filter(tg_id=tg_id).first()
+    user = get_user_by(tg_id=tg_id)
     for key, value in kwargs.items():
         setattr(user, key, value)
     user.save()
+    if "tz" in kwargs and get_provider_of(user):
+        # Provider's slots are computed in their timezone
+        invalidate_availability(user.provider.pk)
+        invalidate_provider_snapshot(tg_id)
     return user
 
 
-@sync_to_async
+@database_sync_to_async
 def count_all_users() -> int:
     total = User.objects.all(is_active=True).count()
     return total
 
 
-@sync_to_async
+@database_sync_to_async
 def get_tz(tg_id: int) -> ZoneInfo:
-    return User.objects.filter(tg_id=tg_id).first().tz
+    return get_user_by(tg_id=tg_id).tz
 
 
-@sync_to_async
+@database_sync_to_async
 def get_provider(tg_id: int = None, username: str = None) -> Provider | None:
     if tg_id:
-        user = User.objects.filter(tg_id=tg_id).first()
+        user = get_user_by(tg_id=tg_id)
     elif username:
         user = User.objects.filter(username=username).first()
     else:
         return None
 
     if user:
-        provider = Provider.objects.select_related("user").filter(user=user).first()
+        provider = get_provider_of(user)
         return provider
     else:
         return None
 
 
-@sync_to_async
+@database_sync_to_async
 def get_provider_data(tg_id: int) -> dict | None:
-    user = User.objects.filter(tg_id=tg_id).first()
-    if user:
-        provider = Provider.objects.filter(user=user).first()
-        data = model_to_dict(provider) if provider else None
-        return data
-    else:
-        return None
+    snapshot = get_provider_snapshot(tg_id)
+    return asdict(snapshot) if snapshot else None
 
 
-@sync_to_async
+@database_sync_to_async
 def get_provider_days_off(tg_id: int) -> str:
-    provider: Provider = User.objects.filter(tg_id=tg_id).first().provider
-    return provider.weekend
+    return get_provider_snapshot(tg_id).weekend
 
 
-@sync_to_async
+@database_sync_to_async
 def add_provider_to_user(
     tg_id: int,
     email: str = None,
@@ -171,119 +194,80 @@ def add_provider_to_user(
     tz: str = None,
     currency: str = None,
 ) -> Provider:
-    user = User.objects.filter(tg_id=tg_id).first()
+    user = get_user_by(tg_id=tg_id)
     if tz:
         user.tz = tz
         user.save()
     provider = Provider.objects.create(user=user, email=email, phone=phone, start=start, end=end, currency=currency)
+    invalidate_provider_snapshot(tg_id)
     return provider
 
 
-@sync_to_async
+@database_sync_to_async
 def is_provider(tg_id: int) -> bool:
-    user = User.objects.filter(tg_id=tg_id).first()
-    return True if (user and user.is_provider()) else False
+    user = get_user_by(tg_id=tg_id)
+    return get_provider_of(user) is not None
 
 
-@sync_to_async
+@database_sync_to_async
 def update_provider(tg_id: int, **kwargs) -> Provider:
-    provider: Provider = User.objects.filter(tg_id=tg_id).first().provider
+    provider: Provider = get_user_by(tg_id=tg_id).provider
     for k, v in kwargs.items():
         setattr(provider, k, v)
     provider.save()
+    invalidate_availability(provider.pk)
+    invalidate_provider_snapshot(tg_id)
 
     return provider
 
 
-@sync_to_async
+@database_sync_to_async
 def add_service(name: str, duration: int, price: Decimal, tg_id: int) -> Service:
-    provider: Provider = User.objects.filter(tg_id=tg_id).first().provider
+    provider: Provider = get_user_by(tg_id=tg_id).provider
     new_service: Service = Service(name=name, price=price, duration=duration)
     new_service.save()
     new_service.providers.add(provider)
+    invalidate_service_catalog(tg_id)
     return new_service
 
 
-@sync_to_async
+@database_sync_to_async
 def check_service_exists(name: str, tg_id: int) -> bool:
-    provider: Provider = User.objects.filter(tg_id=tg_id).first().provider
+    provider: Provider = get_user_by(tg_id=tg_id).provider
     return Service.objects.filter(name=name, providers=provider).exists()
 
 
-@sync_to_async
+@database_sync_to_async
 def get_service_data(name: str, tg_id: int) -> dict | None:
-    provider: Provider = User.objects.filter(tg_id=tg_id).first().provider
-    service = Service.objects.filter(name=name, providers=provider).first()
-    data = model_to_dict(service) if service else None
-    return data
+    service = get_catalog_service(tg_id, name)
+    return asdict(service) if service else None
 
 
-@sync_to_async
+@database_sync_to_async
 def count_upcoming_service_reservations(service_id: int, user_id: int) -> int:
-    tz = User.objects.filter(tg_id=user_id).first().tz
+    tz = get_user_by(tg_id=user_id).tz
     now = datetime.now(tz=tz)
     count = Reservation.objects.select_related("service").filter(service__pk=service_id, end__gt=now).count()
     return count
 
 
-@sync_to_async
+@database_sync_to_async
 def count_past_service_reservations(service_id: int, user_id: int) -> int:
-    tz = User.objects.filter(tg_id=user_id).first().tz
+    tz = get_user_by(tg_id=user_id).tz
     now = datetime.now(tz=tz)
     count = Reservation.objects.select_related("service").filter(service__pk=service_id, start__lt=now).count()
     return count
 
 
-@sync_to_async
-def count_client_reservations_by_pk(provider_tg_id: int, client_pk: int) -> tuple[int, int]:
-    tz = User.objects.filter(tg_id=provider_tg_id).first().tz
-    now = datetime.now(tz=tz)
-    past: int = (
-        Reservation.objects.select_related("service", "provider")
-        .filter(
-            client__pk=client_pk,
-            provider__user__tg_id=provider_tg_id,
-            start__lt=now,
-        )
-        .count()
-    )
-    upcoming: int = (
-        Reservation.objects.select_related("service")
-        .filter(
-            client__pk=client_pk,
-            provider__user__tg_id=provider_tg_id,
-            start__gt=now,
-        )
-        .count()
-    )
-    return past, upcoming
-
-
-async def last_client_reservation(client_pk: int) -> Reservation | None:
-    tz = User.objects.filter(pk=client_pk).first().tz
-    now = datetime.now(tz=tz)
-    return (
-        Reservation.objects.select_related("client")
-        .filter(client__pk=client_pk, start__lt=now)
-        .order_by("start")
-        .last()
-    )
-
+@database_sync_to_async
+def get_provider_client_summaries(tg_id: int) -> list[ClientSummary]:
+    provider = get_provider_of(get_user_by(tg_id=tg_id))
+    return get_client_summaries(provider, datetime.now(tz=provider.user.tz))
 
-async def next_client_reservation(client_pk: int) -> Reservation | None:
-    tz = User.objects.filter(pk=client_pk).first().tz
-    now = datetime.now(tz=tz)
-    return (
-        Reservation.objects.select_related("client")
-        .filter(client__pk=client_pk, start__gt=now)
-        .order_by("start")
-        .first()
-    )
 
-
-@sync_to_async
+@database_sync_to_async
 def count_past_client_reservations(provider_tg_id: int, client_id: int) -> int:
-    tz = User.objects.filter(tg_id=provider_tg_id).first().tz
+    tz = get_user_by(tg_id=provider_tg_id).tz
     now = datetime.now(tz=tz)
     count = (
         Reservation.objects.select_related("service")
@@ -297,82 +281,85 @@ def count_past_client_reservations(provider_tg_id: int, client_id: int) -> int:
     return count
 
 
-@sync_to_async
-def get_provider_services(tg_id: int, is_active: bool = True) -> Union[QuerySet, list[Service]] | None:
-    provider: Provider = User.objects.filter(tg_id=tg_id).first().provider
-    services = Service.objects.filter(providers=provider, is_active=is_active)
-    return services
+@database_sync_to_async
+def get_provider_services(tg_id: int, is_active: bool = True) -> list[ServiceSnapshot]:
+    return [service for service in get_service_catalog(tg_id) if service.is_active == is_active]
+
+
+def invalidate_service_catalogs(service: Service) -> None:
+    # On commit, a worker reloading the catalog earlier would cache the data being replaced
+    for tg_id in service.providers.values_list("user__tg_id", flat=True):
+        transaction.on_commit(partial(invalidate_service_catalog, tg_id))
 
 
-@sync_to_async
+@database_sync_to_async
 def update_service(pk: int, **kwargs):
     service = Service.objects.filter(pk=pk).first()
     for key, value in kwargs.items():
         setattr(service, key, value)
     service.save()
+    invalidate_service_catalogs(service)
     return service
 
 
-@sync_to_async
+@database_sync_to_async
 def remove_service(pk: int):
     service = Service.objects.filter(pk=pk).first()
-    service.delete()
+    with transaction.atomic():
+        # The providers are looked up before the delete takes them
+        invalidate_service_catalogs(service)
+        service.delete()
 
 
-@sync_to_async
-def get_provider_clients(tg_id: int, order_by: str = "client__full_name") -> Union[QuerySet, list[User]] | None:
-    provider: Provider = User.objects.filter(tg_id=tg_id).first().provider
-    reservations_clients_ids = (
-        Reservation.objects.filter(provider=provider).values_list("client", flat=True).distinct().order_by(order_by)
-    )
-    clients = User.objects.filter(pk__in=reservations_clients_ids)
-    return clients if clients else None
+@database_sync_to_async
+def get_provider_client_page(tg_id: int, cursor: str | None = None) -> ClientPage:
+    provider = get_provider_of(get_user_by(tg_id=tg_id))
+    return get_client_page(provider, cursor)
 
 
-@sync_to_async
+@database_sync_to_async
 def get_provider_reservations_by_date(tg_id: int, day: date) -> Union[QuerySet, list[Reservation]] | None:
-    provider: Provider = User.objects.filter(tg_id=tg_id).first().provider
-    return Reservation.objects.filter(provider=provider, date=day, is_canceled=False).values()
+    provider: Provider = get_user_by(tg_id=tg_id).provider
+    return list(Reservation.objects.filter(provider=provider, date=day, is_canceled=False).values())
 
 
-@sync_to_async
+@database_sync_to_async
 def is_vacation(tg_id: int, day: date) -> bool:
-    provider: Provider = User.objects.filter(tg_id=tg_id).first().provider
+    provider: Provider = get_user_by(tg_id=tg_id).provider
     return Vacation.objects.filter(provider=provider, start_date__lte=day, end_date__gte=day).exists()
 
 
-@sync_to_async
+@database_sync_to_async
 def is_weekend(tg_id: int, day: date) -> bool:
-    provider: Provider = User.objects.filter(tg_id=tg_id).first().provider
-    return str(day.weekday()) in provider.weekend
+    return str(day.weekday()) in get_provider_snapshot(tg_id).weekend
 
 
-@sync_to_async
+@database_sync_to_async
 def get_provider_breaks_by_date(tg_id: int, day: date) -> Union[QuerySet, list[Break]] | None:
-    provider: Provider = User.objects.filter(tg_id=tg_id).first().provider
-    return Break.objects.filter(provider=provider, date=day)
+    provider: Provider = get_user_by(tg_id=tg_id).provider
+    return list(Break.objects.filter(provider=provider, date=day))
 
 
-@sync_to_async
+@database_sync_to_async
 def get_upcoming_provider_breaks(
     tg_id: int,
 ) -> Union[QuerySet, list[Break]] | None:
-    user = User.objects.filter(tg_id=tg_id).first()
+    user = get_user_by(tg_id=tg_id)
     now = datetime.now(tz=user.tz)
     breaks = Break.objects.filter(provider=user.provider, end__gte=now)
-    return breaks.values()
+    return list(breaks.values())
 
 
-@sync_to_async
+@database_sync_to_async
 def get_upcoming_provider_vacations(
     tg_id: int,
 ) -> Union[QuerySet, list[Vacation]] | None:
-    user = User.objects.filter(tg_id=tg_id).first()
+    user = get_user_by(tg_id=tg_id)
     now = datetime.now(tz=user.tz)
-    return Vacation.objects.filter(provider=user.provider, end_date__gte=now.date()).values()
+    return list(Vacation.objects.filter(provider=user.provider, end_date__gte=now.date()).values())
 
 
-@sync_to_async
+@database_sync_to_async
 def get_available_hours(
     current_user_tg_id: int,
     provider_tg_id: int,
@@ -380,10 +367,10 @@ def get_available_hours(
     client_tg_id: int = None,
     offset: int = 0,
 ) -> tuple[date, list[datetime], bool, bool]:
-    current_user = User.objects.filter(tg_id=current_user_tg_id).first()
-    provider = User.objects.filter(tg_id=provider_tg_id).first().provider
-    service: Service = Service.objects.filter(name=service_name, providers=provider).first()
-    client = User.objects.filter(tg_id=client_tg_id).first() if client_tg_id else None
+    current_user = get_user_by(tg_id=current_user_tg_id)
+    provider = get_user_by(tg_id=provider_tg_id).provider
+    service = get_catalog_service(provider_tg_id, service_name)
+    client = get_user_by(tg_id=client_tg_id) if client_tg_id else None
     day = datetime.now(tz=current_user.tz).date() + timedelta(days=offset)
 
     available_slots, _is_day_off, _is_vacation = find_available_slots(
@@ -396,9 +383,35 @@ def get_available_hours(
     return day, available_slots, _is_day_off, _is_vacation
 
 
-@sync_to_async
+@database_sync_to_async
+def get_available_days(
+    current_user_tg_id: int,
+    provider_tg_id: int,
+    service_name: str,
+    client_tg_id: int = None,
+    offset: int = 0,
+    limit: int = 1,
+) -> list[tuple[int, date, list[datetime]]]:
+    current_user = get_user_by(tg_id=current_user_tg_id)
+    provider = get_user_by(tg_id=provider_tg_id).provider
+    service = get_catalog_service(provider_tg_id, service_name)
+    client = get_user_by(tg_id=client_tg_id) if client_tg_id else None
+    today = datetime.now(tz=current_user.tz).date()
+
+    available_days = find_available_days(
+        current_user=current_user,
+        provider=provider,
+        start_day=today + timedelta(days=offset),
+        client=client,
+        event_duration=service.duration,
+        limit=limit,
+    )
+    return [((day - today).days, day, available_slots) for day, available_slots, _, _ in available_days]
+
+
+@database_sync_to_async
 def get_available_break_hours(tg_id: int, duration: int, offset: int = 0):
-    user = User.objects.filter(tg_id=tg_id).first()
+    user = get_user_by(tg_id=tg_id)
     day = datetime.now(tz=user.tz).date() + timedelta(days=offset)
     available_slots, _is_weekend, _is_vacation = find_available_slots(
         current_user=user, provider=user.provider, event_duration=duration, day=day
@@ -406,52 +419,53 @@ def get_available_break_hours(tg_id: int, duration: int, offset: int = 0):
     return day, available_slots, _is_weekend, _is_vacation
 
 
-@sync_to_async
+@database_sync_to_async
+def get_provider_overview_by_offset(provider: Provider, offset: int = 0, days: int = 7) -> list[DayOverview]:
+    start_date = datetime.now(tz=provider.user.tz).date() + timedelta(days=offset)
+    return get_provider_overview(provider, start_date, start_date + timedelta(days=days - 1))
+
+
+@database_sync_to_async
 def get_provider_events_by_offset(tg_id: int, offset: int = 0) -> Any:
-    user = User.objects.filter(tg_id=tg_id).first()
+    user = get_user_by(tg_id=tg_id)
     day = datetime.now(tz=user.tz).date() + timedelta(days=offset)
     events = get_events_by_day(day=day, provider=user.provider)
 
     return day, events
 
 
-@sync_to_async
+@database_sync_to_async
 def get_provider_currency(tg_id: int) -> Currency:
-    return Provider.objects.filter(user__tg_id=tg_id).first().currency
+    return get_user_by(tg_id=tg_id).provider.currency
 
 
-@sync_to_async
-def set_reservation(client: User, provider: Provider, service_id: int, start: datetime) -> Reservation:
+@database_sync_to_async
+def set_reservation(client: User, provider: Provider, service_id: int, start: datetime) -> Reservation | None:
+    # None if the time was taken meanwhile. The service is read from the database, not the catalog:
+    # the booking must get its current price and duration
     service = Service.objects.filter(pk=service_id).first()
-    end = start + timedelta(minutes=service.duration)
-    new_reservation = Reservation(
-        client=client,
-        provider=provider,
-        service=service,
-        price=service.price,
-        start=start,
-        end=end,
-    ).save()
-    return new_reservation
+    return book_reservation(client, provider, service, start)
 
 
-@sync_to_async
+@database_sync_to_async
 def set_break(provider: Provider, start: datetime, duration: int) -> Break:
     end = start + timedelta(minutes=duration)
     new_break = Break(provider=provider, start=start, end=end)
     new_break.save()
+    invalidate_availability(provider.pk)
     return new_break
 
 
-@sync_to_async
+@database_sync_to_async
 def cancel_a_break(tg_id: int, break_id: int) -> None:
-    provider: Provider = User.objects.filter(tg_id=tg_id).first().provider
+    provider: Provider = get_user_by(tg_id=tg_id).provider
     break_to_cancel = Break.objects.filter(provider=provider, id=break_id).first()
     if break_to_cancel:
         break_to_cancel.delete()
+        invalidate_availability(provider.pk)
 
 
-@sync_to_async
+@database_sync_to_async
 def add_a_day_off(provider: Provider, day: date):
     vacation = Vacation.objects.filter(provider=provider, start_date__lte=day, end_date__gte=day).first()
     new_vacation = None
@@ -475,11 +489,12 @@ def add_a_day_off(provider: Provider, day: date):
                 end_date=day,
             )
             new_vacation.save()
+        invalidate_availability(provider.pk)
 
     return vacation or new_vacation
 
 
-@sync_to_async
+@database_sync_to_async
 def remove_a_day_off(provider: Provider, day: date):
     vacation = Vacation.objects.filter(provider=provider, start_date__lte=day, end_date__gte=day).first()
     new_vacation = None
@@ -502,27 +517,29 @@ def remove_a_day_off(provider: Provider, day: date):
             vacation.end_date = day - timedelta(days=1)
             vacation.save()
             new_vacation.save()
+        invalidate_availability(provider.pk)
     return new_vacation or vacation
 
 
-@sync_to_async
+@database_sync_to_async
 def update_reservation(identifier: int, **kwargs) -> Reservation:
     reservation = Reservation.objects.filter(identifier=identifier).first()
     for key, value in kwargs.items():
         setattr(reservation, key, value)
     reservation.save()
+    invalidate_availability(reservation.provider_id)
     return reservation
 
 
-@sync_to_async
+@database_sync_to_async
 def get_reservation(identifier: int) -> Reservation:
     reservation = Reservation.objects.filter(identifier=int(identifier)).first()
     return reservation
 
 
-@sync_to_async
+@database_sync_to_async
 def get_client_reservations(tg_id: int, is_past: bool = False) -> Union[QuerySet, list[Reservation]] | None:
-    client = User.objects.filter(tg_id=tg_id).first()
+    client = get_user_by(tg_id=tg_id)
     now = datetime.now(tz=client.tz)
 
     # Both upcoming and past reservations here include an ongoing one if there is such.
@@ -531,7 +548,7 @@ def get_client_reservations(tg_id: int, is_past: bool = False) -> Union[QuerySet
     else:
         base_qs = Reservation.objects.filter(client=client, start__lt=now)
 
-    return (
+    return list(
         base_qs.select_related("provider")
         .annotate(
             tg_username=F("provider__user__tg_username"),
@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import connection
+
+import psycopg
+from psycopg import sql
+from psycopg.conninfo import make_conninfo
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a listener tries to connect again
+LISTEN_RETRY_DELAY = 5
+
+
+class LRUCache:
+    """Thread-safe in-process cache with a bounded size and a time to live for every entry."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class VersionedCache:
+    """
+    Process-local LRU cache whose entries are grouped into scopes (e.g. a provider) invalidated all at once.
+
+    The current version of a scope lives in Django's cache, so with a shared backend (CACHE_URL) an
+    invalidation in one worker process is seen by all the others on their next read.
+    """
+
+    def __init__(self, namespace: str, maxsize: int, ttl: float):
+        self.namespace = namespace
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def _version_key(self, scope: Hashable) -> str:
+        return f"{self.namespace}:version:{scope}"
+
+    def version(self, scope: Hashable) -> str:
+        # Read it before computing a value to store: an invalidation in between must win.
+        key = self._version_key(scope)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, uuid4().hex, timeout=None)
+            version = cache.get(key)
+        return version
+
+    def get(self, scope: Hashable, key: Hashable, version: str) -> Any:
+        item = self.local.get((scope, key))
+        if item is None or item[0] != version:
+            return None
+        return item[1]
+
+    def set(self, scope: Hashable, key: Hashable, value: Any, version: str) -> None:
+        self.local.set((scope, key), (version, value))
+
+    def invalidate(self, scope: Hashable) -> None:
+        cache.set(self._version_key(scope), uuid4().hex, timeout=None)
+
+
+class InvalidationChannel:
+    """
+    Evicts keys from the process-local caches of every worker process, over Postgres LISTEN/NOTIFY.
+
+    Notifications are delivered when the publishing transaction commits. A listener clears its caches
+    whenever it (re)connects, since it may have missed some.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.caches: list[LRUCache] = []
+        self._thread: threading.Thread | None = None
+
+    def subscribe(self, local: LRUCache) -> None:
+        self.caches.append(local)
+
+    def publish(self, key: str) -> None:
+        for local in self.caches:
+            local.delete(key)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", [self.name, key])
+
+    def listen(self) -> None:
+        # Once per process, other databases have no channel and rely on the caches' TTL
+        if self._thread or connection.vendor != "postgresql":
+            return
+        self._thread = threading.Thread(target=self._listen, name=f"listen-{self.name}", daemon=True)
+        self._thread.start()
+
+    def _listen(self) -> None:
+        settings_dict = connection.settings_dict
+        # The ORM's connection options too, e.g. sslmode on Heroku, minus those Django handles itself
+        options = {
+            name: value
+            for name, value in settings_dict["OPTIONS"].items()
+            if name not in ("pool", "server_side_binding", "isolation_level", "assume_role")
+        }
+        conninfo = make_conninfo(
+            dbname=settings_dict["NAME"],
+            user=settings_dict["USER"],
+            password=settings_dict["PASSWORD"],
+            host=settings_dict["HOST"],
+            port=settings_dict["PORT"],
+            **options,
+        )
+        while True:
+            try:
+                with psycopg.connect(conninfo, autocommit=True) as listener:
+                    listener.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.name)))
+                    for local in self.caches:
+                        local.clear()
+                    for notify in listener.notifies():
+                        for local in self.caches:
+                            local.delete(notify.payload)
+            except psycopg.Error:
+                logger.exception("Lost the %s channel, reconnecting in %ss", self.name, LISTEN_RETRY_DELAY)
+                time.sleep(LISTEN_RETRY_DELAY)
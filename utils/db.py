@@ -1,5 +1,6 @@
 from datetime import datetime, time, timedelta
 
+from django.contrib.postgres.fields import DateTimeRangeField
 from django.db import models
 
 from utils.bot.consts import DEFAULT_SLOT
@@ -22,6 +23,11 @@ def normalize_time(value: datetime | time | None) -> datetime | time | None:
     return value
 
 
+class TsTzRange(models.Func):
+    function = "TSTZRANGE"
+    output_field = DateTimeRangeField()
+
+
 class TimeStampedModelMixin:
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -1,5 +1,70 @@
-from datetime import date, datetime, timedelta
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_UTC = EPOCH.replace(tzinfo=timezone.utc)
+MINUTES_PER_DAY = 24 * 60
 
 
 def difference(a: datetime, b: datetime) -> timedelta:
     return datetime.combine(date.today(), b.time()) - datetime.combine(date.today(), a.time())
+
+
+def minute_of_day(value: time) -> int:
+    return value.hour * 60 + value.minute
+
+
+def epoch_minutes(moment: datetime) -> int:
+    # Whole minutes since the epoch in UTC, seconds truncated
+    return int(moment.timestamp()) // 60
+
+
+@dataclass(frozen=True)
+class DayOffsets:
+    """
+    UTC offsets of a local day of a timezone in minutes, to convert its wall-clock times without zoneinfo.
+
+    A day has at most one DST transition: `before` applies from the midnight, `after` from the `transition`.
+    Skipped and repeated wall-clock times resolve the way `fold=0` does, i.e. with the offset before the transition.
+    """
+
+    tz: ZoneInfo
+    midnight: int  # epoch minutes of the day's wall-clock midnight, as if it were UTC
+    before: int
+    after: int
+    transition: int  # UTC epoch minutes, the next midnight if there is no transition
+
+    def to_utc(self, minute: int) -> int:
+        # Wall-clock minutes since the midnight to UTC epoch minutes
+        if minute < self.transition - self.midnight + max(self.before, self.after):
+            return self.midnight + minute - self.before
+        return self.midnight + minute - self.after
+
+    def to_datetime(self, utc_minute: int) -> datetime:
+        # UTC epoch minutes within the day to an aware local datetime
+        offset = self.before if utc_minute < self.transition else self.after
+        local = utc_minute + offset
+        fold = int(utc_minute >= self.transition and local < self.transition + self.before)
+        return (EPOCH + timedelta(minutes=local)).replace(tzinfo=self.tz, fold=fold)
+
+
+@lru_cache(maxsize=4096)
+def day_offsets(day: date, tz: ZoneInfo) -> DayOffsets:
+    midnight = (datetime.combine(day, time()) - EPOCH) // timedelta(minutes=1)
+    before = datetime.combine(day, time(), tzinfo=tz).utcoffset() // timedelta(minutes=1)
+    after = datetime.combine(day + timedelta(days=1), time(), tzinfo=tz).utcoffset() // timedelta(minutes=1)
+    low, high = midnight - before, midnight + MINUTES_PER_DAY - after
+
+    if before != after:
+        # The first UTC minute with the new offset
+        while low < high:
+            middle = (low + high) // 2
+            offset = datetime.fromtimestamp(middle * 60, tz=timezone.utc).astimezone(tz).utcoffset()
+            if offset // timedelta(minutes=1) == after:
+                high = middle
+            else:
+                low = middle + 1
+
+    return DayOffsets(tz=tz, midnight=midnight, before=before, after=after, transition=high)
@@ -0,0 +1,400 @@
+import asyncio
+import threading
+from contextvars import ContextVar
+from datetime import date, datetime, time, timedelta, timezone
+from time import monotonic, sleep
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from apps.roles.models import Provider, User
+from tgbot.middlewares.identity_map import IdentityMapMiddleware
+from utils.bot.db_executor import DBExecutor, database_sync_to_async
+from utils.bot.identity_map import IdentityMap, get_provider_of, get_user_by, identity_map, remember_user
+from utils.bot.outbox import Outbox
+from utils.cache import InvalidationChannel, LRUCache, VersionedCache
+from utils.misc.time import MINUTES_PER_DAY, day_offsets, epoch_minutes
+
+KYIV = ZoneInfo("Europe/Kyiv")
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class DayOffsetsTests(SimpleTestCase):
+    def assertMatchesZoneinfo(self, day: date, tz: ZoneInfo):
+        offsets = day_offsets(day, tz)
+        for minute in range(MINUTES_PER_DAY):
+            local = datetime.combine(day, time(minute // 60, minute % 60), tzinfo=tz)
+            self.assertEqual(offsets.to_utc(minute), epoch_minutes(local), local)
+
+        start = epoch_minutes(datetime.combine(day, time(), tzinfo=tz))
+        end = epoch_minutes(datetime.combine(day + timedelta(days=1), time(), tzinfo=tz))
+        for utc_minute in range(start, end):
+            moment = datetime.fromtimestamp(utc_minute * 60, tz=timezone.utc).astimezone(tz)
+            converted = offsets.to_datetime(utc_minute)
+            self.assertEqual(converted, moment)
+            self.assertEqual(
+                (converted.replace(tzinfo=None), converted.fold), (moment.replace(tzinfo=None), moment.fold)
+            )
+
+    def test_ordinary_day(self):
+        offsets = day_offsets(date(2026, 1, 15), KYIV)
+        self.assertEqual(offsets.before, offsets.after)
+        self.assertMatchesZoneinfo(date(2026, 1, 15), KYIV)
+
+    def test_spring_forward(self):
+        # 03:00 becomes 04:00, the day has 23 hours and the skipped times resolve with the winter offset
+        day = date(2026, 3, 29)
+        offsets = day_offsets(day, KYIV)
+        self.assertEqual((offsets.before, offsets.after), (120, 180))
+        self.assertEqual(offsets.to_utc(MINUTES_PER_DAY) - offsets.to_utc(0), 23 * 60)
+        self.assertEqual(offsets.to_utc(3 * 60 + 30), offsets.to_utc(4 * 60 + 30))
+        self.assertMatchesZoneinfo(day, KYIV)
+
+    def test_fall_back(self):
+        # 04:00 becomes 03:00, the day has 25 hours and the repeated times resolve with the summer offset
+        day = date(2026, 10, 25)
+        offsets = day_offsets(day, KYIV)
+        self.assertEqual((offsets.before, offsets.after), (180, 120))
+        self.assertEqual(offsets.to_utc(MINUTES_PER_DAY) - offsets.to_utc(0), 25 * 60)
+        self.assertMatchesZoneinfo(day, KYIV)
+
+    def test_transition_at_midnight(self):
+        # Havana moves its clocks at midnight: 00:00 is skipped in March and repeated in November
+        self.assertMatchesZoneinfo(date(2026, 3, 8), ZoneInfo("America/Havana"))
+        self.assertMatchesZoneinfo(date(2026, 11, 1), ZoneInfo("America/Havana"))
+
+
+class FakeBot:
+    def __init__(self, errors: dict[str, list[Exception]] | None = None):
+        # Errors raised by the next sends of a text, in order
+        self.errors = errors or {}
+        self.sent: list[tuple[float, int, str]] = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        await asyncio.sleep(0)
+        if self.errors.get(text):
+            raise self.errors[text].pop(0)
+        self.sent.append((monotonic(), chat_id, text))
+
+
+def error(exception_class, *args):
+    return exception_class(SendMessage(chat_id=1, text=""), "error", *args)
+
+
+class OutboxTests(SimpleTestCase):
+    def run_outbox(self, bot: FakeBot, messages: list[tuple], chat_interval: float = 0.05, rate: float = 1000):
+        async def run():
+            outbox = Outbox(chat_interval=chat_interval)
+            for chat_id, text, *coalesce_key in messages:
+                outbox.send_message(chat_id, text, *coalesce_key)
+            outbox.start(bot, rate)
+            await outbox.stop()
+            return outbox
+
+        return asyncio.run(run())
+
+    def test_chat_interval_and_order(self):
+        bot = FakeBot()
+        outbox = self.run_outbox(bot, [(1, "a1"), (2, "b1"), (1, "a2"), (1, "a3")])
+        self.assertEqual([text for _at, chat_id, text in bot.sent if chat_id == 1], ["a1", "a2", "a3"])
+        times = [at for at, chat_id, _text in bot.sent if chat_id == 1]
+        self.assertTrue(all(later - earlier >= 0.05 for earlier, later in zip(times, times[1:])))
+        # The other chat doesn't wait for the first one
+        self.assertLess(bot.sent.index(next(item for item in bot.sent if item[1] == 2)), 2)
+        self.assertEqual((outbox.stats.sent, outbox.stats.queued), (4, 0))
+
+    def test_bot_rate(self):
+        bot = FakeBot()
+        self.run_outbox(bot, [(chat_id, "hi") for chat_id in range(5)], rate=20)
+        times = [at for at, _chat_id, _text in bot.sent]
+        self.assertEqual(len(times), 5)
+        self.assertGreaterEqual(times[-1] - times[0], 4 / 20 * 0.9)
+
+    def test_coalesced(self):
+        bot = FakeBot()
+        outbox = self.run_outbox(bot, [(1, "first"), (1, "status 1", "status"), (1, "status 2", "status")])
+        self.assertEqual([text for _at, _chat_id, text in bot.sent], ["first", "status 2"])
+        self.assertEqual((outbox.stats.enqueued, outbox.stats.coalesced), (2, 1))
+
+    def test_retry_after_postpones_the_chat(self):
+        bot = FakeBot({"a1": [error(TelegramRetryAfter, 1)]})
+        started = monotonic()
+        outbox = self.run_outbox(bot, [(1, "a1"), (1, "a2"), (2, "b1")])
+        self.assertEqual([text for _at, chat_id, text in bot.sent if chat_id == 1], ["a1", "a2"])
+        self.assertGreaterEqual(bot.sent[-1][0] - started, 1)
+        self.assertLess(next(at for at, chat_id, _text in bot.sent if chat_id == 2) - started, 1)
+        self.assertEqual((outbox.stats.retried, outbox.stats.sent, outbox.stats.failed), (1, 3, 0))
+
+    def test_gives_up(self):
+        bot = FakeBot({"blocked": [error(TelegramBadRequest)], "flaky": [error(TelegramNetworkError)]})
+        outbox = self.run_outbox(bot, [(1, "blocked"), (1, "next"), (2, "flaky")])
+        self.assertEqual(sorted(text for _at, _chat_id, text in bot.sent), ["flaky", "next"])
+        self.assertEqual((outbox.stats.failed, outbox.stats.retried, outbox.stats.queued), (1, 1, 0))
+
+    def test_unexpected_error_drops_the_message(self):
+        bot = FakeBot({"broken": [ValueError("bug")]})
+        with self.assertLogs("utils.bot.outbox", "ERROR") as logs:
+            outbox = self.run_outbox(bot, [(1, "broken"), (1, "next")])
+        self.assertIn("Traceback", logs.output[0])
+        self.assertEqual([text for _at, _chat_id, text in bot.sent], ["next"])
+        self.assertEqual((outbox.stats.failed, outbox.stats.retried, outbox.stats.queued), (1, 0, 0))
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+        self.assertEqual(len(cache), 2)
+
+    def test_expired(self):
+        cache = LRUCache(maxsize=2, ttl=-1)
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a", "missing"), "missing")
+        self.assertEqual(len(cache), 0)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class VersionedCacheTests(SimpleTestCase):
+    def test_invalidated_scope(self):
+        cache = VersionedCache("test", maxsize=10, ttl=60)
+        version = cache.version(1)
+        cache.set(1, "day", "slots", version)
+        cache.set(2, "day", "other slots", cache.version(2))
+        self.assertEqual(cache.get(1, "day", cache.version(1)), "slots")
+
+        cache.invalidate(1)
+        self.assertIsNone(cache.get(1, "day", cache.version(1)))
+        self.assertEqual(cache.get(2, "day", cache.version(2)), "other slots")
+
+    def test_invalidated_in_another_process(self):
+        # Two processes share Django's cache, not their local ones
+        first, second = VersionedCache("test", maxsize=10, ttl=60), VersionedCache("test", maxsize=10, ttl=60)
+        first.set(1, "day", "slots", first.version(1))
+        self.assertEqual(first.version(1), second.version(1))
+
+        second.invalidate(1)
+        self.assertIsNone(first.get(1, "day", first.version(1)))
+
+    def test_invalidation_while_computing_wins(self):
+        cache = VersionedCache("test", maxsize=10, ttl=60)
+        version = cache.version(1)
+        cache.invalidate(1)
+        cache.set(1, "day", "stale slots", version)
+        self.assertIsNone(cache.get(1, "day", cache.version(1)))
+
+
+class InvalidationChannelTests(TransactionTestCase):
+    def wait_for(self, condition) -> None:
+        deadline = monotonic() + 5
+        while not condition():
+            self.assertLess(monotonic(), deadline, "Timed out")
+            sleep(0.01)
+
+    def terminate_listener(self) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                "WHERE datname = current_database() AND pid <> pg_backend_pid() AND query LIKE 'LISTEN%%'"
+            )
+            self.assertEqual(len(cursor.fetchall()), 1)
+
+    def listener_query(self) -> str:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT string_agg(query, '') FROM pg_stat_activity "
+                "WHERE datname = current_database() AND pid <> pg_backend_pid() AND query LIKE 'LISTEN%%'"
+            )
+            return cursor.fetchone()[0] or ""
+
+    def test_publish_evicts_local_caches(self):
+        channel = InvalidationChannel("test_publish")
+        first, second = LRUCache(maxsize=10, ttl=60), LRUCache(maxsize=10, ttl=60)
+        for local in (first, second):
+            channel.subscribe(local)
+            local.set("provider:1", "snapshot")
+            local.set("provider:2", "snapshot")
+        channel.publish("provider:1")
+        self.assertEqual([local.get("provider:1") for local in (first, second)], [None, None])
+        self.assertEqual([local.get("provider:2") for local in (first, second)], ["snapshot", "snapshot"])
+
+    def test_listener(self):
+        channel = InvalidationChannel("test_listener")
+        local = LRUCache(maxsize=10, ttl=60)
+        channel.subscribe(local)
+        # Cleared once listening
+        local.set("before", "snapshot")
+        channel.listen()
+        self.wait_for(lambda: local.get("before") is None)
+
+        # Published by another process
+        local.set("provider:1", "snapshot")
+        local.set("provider:2", "snapshot")
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [channel.name, "provider:1"])
+        self.wait_for(lambda: local.get("provider:1") is None)
+        self.assertEqual(local.get("provider:2"), "snapshot")
+
+        # Notifications may be missed while reconnecting
+        with mock.patch("utils.cache.LISTEN_RETRY_DELAY", 0), self.assertLogs("utils.cache", "ERROR"):
+            self.terminate_listener()
+            self.wait_for(lambda: local.get("provider:2") is None)
+
+        # Leaves the test database alone until the process ends
+        with mock.patch("utils.cache.LISTEN_RETRY_DELAY", 3600), self.assertLogs("utils.cache", "ERROR"):
+            self.wait_for(lambda: "LISTEN" in self.listener_query())
+            self.terminate_listener()
+            self.wait_for(lambda: not self.listener_query())
+
+
+class IdentityMapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = Provider.objects.create(user=User.objects.create(username="provider", tg_id=1))
+        cls.client_user = User.objects.create(username="client", tg_id=2)
+
+    def setUp(self):
+        token = identity_map.set(IdentityMap())
+        self.addCleanup(identity_map.reset, token)
+
+    def test_each_user_is_queried_once(self):
+        with self.assertNumQueries(1):
+            user = get_user_by(tg_id=1)
+            self.assertIs(get_user_by(tg_id="1"), user)
+            self.assertIs(get_user_by(pk=self.provider.user.pk), user)
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_user_by(tg_id=3))
+            self.assertIsNone(get_user_by(tg_id=3))
+
+    def test_providers_are_cached_on_the_user(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(get_provider_of(get_user_by(tg_id=1)), self.provider)
+            self.assertEqual(get_provider_of(get_user_by(tg_id=1)), self.provider)
+        with self.assertNumQueries(2):
+            self.assertIsNone(get_provider_of(get_user_by(tg_id=2)))
+            self.assertIsNone(get_provider_of(get_user_by(tg_id=2)))
+        self.assertIsNone(get_provider_of(None))
+
+    def test_remembered_user(self):
+        self.assertIsNone(get_user_by(tg_id=3))
+        user = User.objects.create(username="new", tg_id=3)
+        remember_user(user)
+        with self.assertNumQueries(0):
+            self.assertIs(get_user_by(tg_id=3), user)
+            self.assertIs(get_user_by(pk=user.pk), user)
+
+    def test_outside_an_update(self):
+        identity_map.set(None)
+        with self.assertNumQueries(2):
+            self.assertEqual(get_user_by(tg_id=2), get_user_by(tg_id=2))
+        remember_user(self.client_user)
+        self.assertIsNone(identity_map.get())
+
+
+class IdentityMapMiddlewareTests(SimpleTestCase):
+    def test_a_map_per_update(self):
+        middleware = IdentityMapMiddleware()
+        maps = []
+
+        async def handler(event, data):
+            maps.append(identity_map.get())
+
+        async def run():
+            for _update in range(2):
+                await middleware(handler, object(), {})
+            return identity_map.get()
+
+        self.assertIsNone(asyncio.run(run()))
+        self.assertEqual(len(maps), 2)
+        self.assertIsInstance(maps[0], IdentityMap)
+        self.assertIsNot(maps[0], maps[1])
+
+
+request_id: ContextVar[int | None] = ContextVar("request_id", default=None)
+
+
+class DBExecutorTests(SimpleTestCase):
+    def executor(self, max_workers: int, slow_wait: float = 10) -> DBExecutor:
+        executor = DBExecutor(max_workers=max_workers, slow_wait=slow_wait)
+        self.addCleanup(executor.pool.shutdown)
+        return executor
+
+    def test_concurrent_calls_are_capped(self):
+        executor = self.executor(max_workers=2)
+        lock, running, most = threading.Lock(), [0], [0]
+
+        def query():
+            with lock:
+                running[0] += 1
+                most[0] = max(most[0], running[0])
+            sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+        async def run():
+            await asyncio.gather(*(executor.run(query) for _call in range(6)))
+
+        asyncio.run(run())
+        self.assertEqual(most[0], 2)
+        stats = executor.snapshot()
+        self.assertEqual((stats["submitted"], stats["completed"], stats["queued"], stats["running"]), (6, 6, 0, 0))
+        self.assertGreaterEqual(stats["max_queued"], 4)
+        self.assertGreaterEqual(stats["max_wait"], 0.05)
+        self.assertIsNone(stats["pool"])
+
+    def test_context_goes_along(self):
+        executor = self.executor(max_workers=1)
+
+        async def run():
+            request_id.set(7)
+            return await executor.run(request_id.get)
+
+        self.assertEqual(asyncio.run(run()), 7)
+
+    def test_slow_wait_is_logged(self):
+        executor = self.executor(max_workers=1, slow_wait=0.01)
+
+        async def run():
+            await asyncio.gather(executor.run(sleep, 0.05), executor.run(sleep, 0.05))
+
+        with self.assertLogs("utils.bot.db_executor", "WARNING") as logs:
+            asyncio.run(run())
+        self.assertIn("waited", logs.output[0])
+
+    def test_decorator(self):
+        @database_sync_to_async
+        def add(a: int, b: int) -> int:
+            return a + b
+
+        self.assertEqual(asyncio.run(add(1, b=2)), 3)
+        self.assertEqual(add.__name__, "add")
+
+
+class DBExecutorConnectionTests(TransactionTestCase):
+    def test_thread_keeps_its_connection_without_conn_max_age(self):
+        executor = DBExecutor(max_workers=1, slow_wait=10)
+        self.addCleanup(executor.pool.shutdown)
+
+        def backend_pid() -> int:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_backend_pid()")
+                return cursor.fetchone()[0]
+
+        async def run():
+            try:
+                return [await executor.run(backend_pid) for _call in range(2)]
+            finally:
+                await executor.run(lambda: connection.close())
+
+        # The threads' connections share the settings dict with this one
+        with mock.patch.dict(connection.settings_dict, CONN_MAX_AGE=0):
+            first, second = asyncio.run(run())
+        self.assertEqual(first, second)